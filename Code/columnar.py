@@ -0,0 +1,80 @@
+import numpy
+
+from entrylist import EntryList
+
+
+def buffer_to_array(buf, size):
+    if size <= 0:
+        return numpy.zeros(0)
+    buf.SetSize(size)
+    return numpy.frombuffer(buf, dtype=numpy.float64, count=size).copy()
+
+
+# reads the given TTree expressions (e.g. "lep_n" or "lep_pt[0]") for the entries [first, first + count)
+# returns a dict of float64 arrays of length count, entries without a value for an expression are NaN
+# TTree::Draw only reads the branches used in the expressions
+def read_columns(tree, expressions, first, count):
+    columns = {}
+    tree.SetEstimate(count + 1)
+
+    # TTree::Draw hands out at most 4 values per row, the first one is used for the entry number
+    # it drops the whole row if one index is out of range, so only expressions with the same index (e.g. "[1]")
+    # are drawn together and scalar branches like the weight never lose entries
+    by_index = {}
+    for expression in expressions:
+        by_index.setdefault(expression[expression.find("["):] if "[" in expression else "", []).append(expression)
+    groups = []
+    for index in sorted(by_index):
+        same_index = by_index[index]
+        groups += [same_index[i:i + 3] for i in range(0, len(same_index), 3)]
+
+    for group in groups:
+        rows = tree.Draw(":".join(["Entry$"] + group), "", "goff", count, first)
+        entries = buffer_to_array(tree.GetV1(), rows).astype(numpy.int64) - first
+
+        buffers = (tree.GetV2(), tree.GetV3(), tree.GetV4())
+        for expression, buf in zip(group, buffers):
+            column = numpy.full(count, numpy.nan)
+            column[entries] = buffer_to_array(buf, rows)
+            columns[expression] = column
+
+    return columns
+
+
+# evaluates the selection chunk by chunk on whole columns and returns an EntryList of the passing entries
+def select(tree, selection, num_entries=-1, chunk_size=500000):
+    if num_entries < 0:
+        num_entries = tree.GetEntriesFast()
+
+    # chunks have to start on a byte of the entry list bitmask
+    chunk_size -= chunk_size % 8
+
+    entry_list = EntryList(num_entries)
+    expressions = selection.columns()
+
+    for first in range(0, num_entries, chunk_size):
+        print 100 * first / num_entries, r"% complete."
+        count = min(chunk_size, num_entries - first)
+        columns = read_columns(tree, expressions, first, count)
+        entry_list.enter_mask(first, selection.mask(columns))
+
+    return entry_list
+
+
+# number of entries, sum of weights and sum of squared weights of the first num_entries entries
+# only the weight branch is read, chunk by chunk, without weight every entry counts 1
+def sum_weights(tree, weight, num_entries=-1, chunk_size=500000):
+    if num_entries < 0:
+        num_entries = tree.GetEntriesFast()
+    if weight is None:
+        return num_entries, float(num_entries), float(num_entries)
+
+    sumw = 0.0
+    sumw2 = 0.0
+    for first in range(0, num_entries, chunk_size):
+        count = min(chunk_size, num_entries - first)
+        weights = read_columns(tree, [weight], first, count)[weight]
+        sumw += numpy.nansum(weights)
+        sumw2 += numpy.nansum(weights ** 2)
+
+    return num_entries, sumw, sumw2
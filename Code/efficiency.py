@@ -0,0 +1,282 @@
+import ROOT
+import numpy
+
+from plotwrapper import Histogram
+
+
+def ratio(passed, total):
+    rv = numpy.zeros(total.shape)
+    nonzero = total != 0
+    rv[nonzero] = passed[nonzero] / total[nonzero]
+    return rv
+
+
+# symmetric binomial errors from the sums of weights and squared weights, as TH1::Divide with option "B"
+def binomial_errors(passed, passed_sumw2, total, total_sumw2):
+    eff = ratio(passed, total)
+    rv = numpy.zeros(total.shape)
+    nonzero = total != 0
+    variance = ((1 - 2 * eff) * passed_sumw2 + eff * eff * total_sumw2)[nonzero] / total[nonzero] ** 2
+    rv[nonzero] = numpy.sqrt(numpy.abs(variance))
+    return rv
+
+
+# lower and upper errors of the Clopper-Pearson interval, weighted bins use the effective number of entries
+# the beta quantiles are the ones TEfficiency::ClopperPearson uses
+def clopper_pearson_errors(passed, total, total_sumw2, confidence=0.682689492137):
+    eff = ratio(passed, total)
+    n = numpy.zeros(total.shape)
+    nonzero = total_sumw2 != 0
+    n[nonzero] = total[nonzero] ** 2 / total_sumw2[nonzero]
+    k = eff * n
+
+    alpha = 1 - confidence
+    lower = numpy.zeros(total.shape)
+    upper = numpy.ones(total.shape)
+    for i in numpy.flatnonzero(n > 0):
+        if k.flat[i] > 0:
+            lower.flat[i] = ROOT.Math.beta_quantile(alpha / 2, k.flat[i], n.flat[i] - k.flat[i] + 1)
+        if k.flat[i] < n.flat[i]:
+            upper.flat[i] = ROOT.Math.beta_quantile(1 - alpha / 2, k.flat[i] + 1, n.flat[i] - k.flat[i])
+    return eff - lower, upper - eff
+
+
+# binned efficiency of probes passing a requirement, numerator and denominator are filled directly into
+# histograms, so the memory needed does not grow with the number of events
+class Efficiency(object):
+    # probes filled one by one are collected and binned in batches of this size
+    buffer_size = 65536
+
+    def __init__(self, name, title, bins, xmin, xmax):
+        self.name = name
+        self.passed = Histogram(name + "_num", title, bins, xmin, xmax)
+        self.total = Histogram(name + "_den", title, bins, xmin, xmax)
+        self._values = []
+        self._passed = []
+        self._weights = []
+
+    def fill(self, value, passed, weight=1):
+        self._values.append(value)
+        self._passed.append(bool(passed))
+        self._weights.append(weight)
+        if len(self._values) >= Efficiency.buffer_size:
+            self.flush()
+
+    # fills arrays of probe values, pass decisions and weights at once
+    def fill_array(self, values, passed, weights=None):
+        values = numpy.asarray(values, dtype=numpy.float64)
+        passed = numpy.asarray(passed, dtype=bool)
+        if weights is None:
+            weights = numpy.ones(len(values))
+        weights = numpy.asarray(weights, dtype=numpy.float64)
+
+        self.total.fill(values, weights)
+        self.passed.fill(values[passed], weights[passed])
+
+    def flush(self):
+        if self._values:
+            self.fill_array(self._values, self._passed, self._weights)
+        self._values = []
+        self._passed = []
+        self._weights = []
+
+    def merge(self, other):
+        self.flush()
+        other.flush()
+        self.passed.merge(other.passed)
+        self.total.merge(other.total)
+
+    # efficiency of every bin (including under- and overflow), empty bins are 0
+    def ratio(self):
+        self.flush()
+        return ratio(self.passed.sumw, self.total.sumw)
+
+    # symmetric binomial errors, for weights as in TH1::Divide with option "B"
+    def binomial_errors(self):
+        self.flush()
+        return binomial_errors(self.passed.sumw, self.passed.sumw2, self.total.sumw, self.total.sumw2)
+
+    def clopper_pearson_errors(self, confidence=0.682689492137):
+        self.flush()
+        return clopper_pearson_errors(self.passed.sumw, self.total.sumw, self.total.sumw2, confidence)
+
+    def errors(self, method="binomial"):
+        if method == "binomial":
+            error = self.binomial_errors()
+            return error, error
+        if method == "clopper_pearson":
+            return self.clopper_pearson_errors()
+        raise ValueError("Unknown error method " + method)
+
+    # efficiency as a Histogram with binomial errors
+    def histogram(self, name=None):
+        rv = self.total.copy(self.name if name is None else name)
+        rv.sumw = self.ratio()
+        rv.sumw2 = self.binomial_errors() ** 2
+        rv.reset_stats()
+        return rv
+
+    # efficiency as a TGraphAsymmErrors over the bins in range
+    def graph(self, method="binomial"):
+        low, high = self.errors(method)
+        hist = self.total
+        x = hist.centers()[1:-1]
+        half_width = numpy.full(hist.bins, 0.5 * (hist.xmax - hist.xmin) / hist.bins)
+
+        rv = ROOT.TGraphAsymmErrors(hist.bins, x, self.ratio()[1:-1], half_width, half_width,
+                                    numpy.ascontiguousarray(low[1:-1]), numpy.ascontiguousarray(high[1:-1]))
+        rv.SetName(self.name)
+        rv.SetTitle(hist.title)
+        return rv
+
+
+# bin numbers along one axis given by its bin edges, 0 is the underflow and len(edges) the overflow bin
+def find_bins(edges, values):
+    return numpy.searchsorted(edges, numpy.asarray(values, dtype=numpy.float64), side="right")
+
+
+# efficiency binned in several variables at once (e.g. pt x eta x phi), axes are (name, bin edges) pairs
+# every axis has an under- and overflow bin like Histogram
+class EfficiencyMap(object):
+    buffer_size = 65536
+
+    def __init__(self, name, axes):
+        self.name = name
+        self.names = [axis_name for axis_name, edges in axes]
+        self.edges = [numpy.asarray(edges, dtype=numpy.float64) for axis_name, edges in axes]
+        self.shape = tuple(len(edges) + 1 for edges in self.edges)
+
+        self.passed = numpy.zeros(self.shape)
+        self.passed_sumw2 = numpy.zeros(self.shape)
+        self.total = numpy.zeros(self.shape)
+        self.total_sumw2 = numpy.zeros(self.shape)
+
+        self._values = []
+        self._passed = []
+        self._weights = []
+
+    @staticmethod
+    def uniform(bins, xmin, xmax):
+        return numpy.linspace(xmin, xmax, bins + 1)
+
+    def fill(self, values, passed, weight=1):
+        self._values.append(values)
+        self._passed.append(bool(passed))
+        self._weights.append(weight)
+        if len(self._values) >= EfficiencyMap.buffer_size:
+            self.flush()
+
+    # columns holds one array per axis
+    def fill_array(self, columns, passed, weights=None):
+        index = numpy.ravel_multi_index([find_bins(edges, column) for edges, column in zip(self.edges, columns)], self.shape)
+        passed = numpy.asarray(passed, dtype=bool)
+        if weights is None:
+            weights = numpy.ones(len(index))
+        weights = numpy.asarray(weights, dtype=numpy.float64)
+
+        size = self.total.size
+        self.total += numpy.bincount(index, weights, size).reshape(self.shape)
+        self.total_sumw2 += numpy.bincount(index, weights * weights, size).reshape(self.shape)
+        self.passed += numpy.bincount(index[passed], weights[passed], size).reshape(self.shape)
+        self.passed_sumw2 += numpy.bincount(index[passed], weights[passed] ** 2, size).reshape(self.shape)
+
+    def flush(self):
+        if self._values:
+            self.fill_array(numpy.array(self._values, dtype=numpy.float64).T, self._passed, self._weights)
+        self._values = []
+        self._passed = []
+        self._weights = []
+
+    def merge(self, other):
+        self.flush()
+        other.flush()
+        if self.names != other.names or not all(numpy.array_equal(a, b) for a, b in zip(self.edges, other.edges)):
+            raise ValueError("Incompatible binning of " + self.name + " and " + other.name)
+        self.passed += other.passed
+        self.passed_sumw2 += other.passed_sumw2
+        self.total += other.total
+        self.total_sumw2 += other.total_sumw2
+
+    def ratio(self):
+        self.flush()
+        return ratio(self.passed, self.total)
+
+    def binomial_errors(self):
+        self.flush()
+        return binomial_errors(self.passed, self.passed_sumw2, self.total, self.total_sumw2)
+
+    def clopper_pearson_errors(self, confidence=0.682689492137):
+        self.flush()
+        return clopper_pearson_errors(self.passed, self.total, self.total_sumw2, confidence)
+
+    def save(self, path):
+        self.flush()
+        arrays = dict(("edges_" + axis_name, edges) for axis_name, edges in zip(self.names, self.edges))
+        numpy.savez(path, name=self.name, names=self.names, passed=self.passed, passed_sumw2=self.passed_sumw2,
+                    total=self.total, total_sumw2=self.total_sumw2, **arrays)
+
+    @staticmethod
+    def load(path):
+        f = numpy.load(path)
+        names = [str(axis_name) for axis_name in f["names"]]
+        rv = EfficiencyMap(str(f["name"]), [(axis_name, f["edges_" + axis_name]) for axis_name in names])
+        rv.passed = f["passed"]
+        rv.passed_sumw2 = f["passed_sumw2"]
+        rv.total = f["total"]
+        rv.total_sumw2 = f["total_sumw2"]
+        return rv
+
+
+# data/MC efficiency ratios in the bins of two EfficiencyMaps with the same binning
+# values outside of the binning get the scale factor of the nearest bin
+class ScaleFactors(object):
+    def __init__(self, names, edges, values, errors):
+        self.names = names
+        self.edges = edges
+        self.values = values
+        self.errors = errors
+
+    @staticmethod
+    def from_maps(data, mc):
+        if data.names != mc.names or not all(numpy.array_equal(a, b) for a, b in zip(data.edges, mc.edges)):
+            raise ValueError("Incompatible binning of " + data.name + " and " + mc.name)
+
+        eff_data, eff_mc = data.ratio(), mc.ratio()
+        error_data, error_mc = data.binomial_errors(), mc.binomial_errors()
+
+        # only the bins in range, bins without MC probes get a scale factor of 1
+        inner = tuple(slice(1, -1) for _ in data.edges)
+        eff_data, eff_mc = eff_data[inner], eff_mc[inner]
+        error_data, error_mc = error_data[inner], error_mc[inner]
+
+        values = numpy.where(eff_mc != 0, ratio(eff_data, eff_mc), 1.0)
+        errors = values * numpy.sqrt(ratio(error_data, eff_data) ** 2 + ratio(error_mc, eff_mc) ** 2)
+        return ScaleFactors(list(data.names), list(data.edges), values, errors)
+
+    def _index(self, columns):
+        bins = [numpy.clip(find_bins(edges, column) - 1, 0, len(edges) - 2) for edges, column in zip(self.edges, columns)]
+        return tuple(bins)
+
+    # scale factor for every event, columns holds one value or array per axis
+    def lookup(self, *columns):
+        return self.values[self._index(columns)]
+
+    def lookup_errors(self, *columns):
+        return self.errors[self._index(columns)]
+
+    def table(self):
+        lines = []
+        for index in numpy.ndindex(*self.values.shape):
+            ranges = ["%s [%g, %g)" % (axis_name, edges[i], edges[i + 1]) for axis_name, edges, i in zip(self.names, self.edges, index)]
+            lines.append("%-60s %8.4f +- %.4f" % (" ".join(ranges), self.values[index], self.errors[index]))
+        return "\n".join(lines)
+
+    def save(self, path):
+        arrays = dict(("edges_" + axis_name, edges) for axis_name, edges in zip(self.names, self.edges))
+        numpy.savez(path, names=self.names, values=self.values, errors=self.errors, **arrays)
+
+    @staticmethod
+    def load(path):
+        f = numpy.load(path)
+        names = [str(axis_name) for axis_name in f["names"]]
+        return ScaleFactors(names, [f["edges_" + axis_name] for axis_name in names], f["values"], f["errors"])
@@ -0,0 +1,92 @@
+import hashlib
+import os
+import os.path
+
+import numpy
+
+
+# pass/fail bitmask of the entries of a tree, similar to ROOT's TEntryList
+# one bit per entry, stored in a sidecar file next to the input file
+class EntryList(object):
+    magic = "F91ENTRYLIST"
+
+    def __init__(self, num_entries, bits=None):
+        self.num_entries = num_entries
+        if bits is None:
+            bits = bytearray((num_entries + 7) // 8)
+        self.bits = bits
+
+    def enter(self, entry):
+        self.bits[entry >> 3] |= 1 << (entry & 7)
+
+    # sets the bits of the entries [first, first + len(mask)) from a boolean array, first has to be a multiple of 8
+    def enter_mask(self, first, mask):
+        if first % 8 != 0:
+            raise ValueError("First entry of a mask has to be a multiple of 8")
+        padded = numpy.zeros(len(mask) + (-len(mask)) % 8, dtype=numpy.uint8)
+        padded[:len(mask)] = mask
+        # packbits is big endian within a byte, the entry list is little endian
+        packed = numpy.packbits(padded.reshape(-1, 8)[:, ::-1])
+        start = first >> 3
+        current = numpy.frombuffer(bytes(self.bits[start:start + len(packed)]), dtype=numpy.uint8)
+        self.bits[start:start + len(packed)] = bytearray((current | packed).tobytes())
+
+    def merge(self, other):
+        merged = numpy.frombuffer(bytes(self.bits), dtype=numpy.uint8) | numpy.frombuffer(bytes(other.bits), dtype=numpy.uint8)
+        self.bits = bytearray(merged.tobytes())
+
+    def contains(self, entry):
+        return bool(self.bits[entry >> 3] & (1 << (entry & 7)))
+
+    def entries(self):
+        for byte_index, byte in enumerate(self.bits):
+            if not byte:
+                continue
+            for bit in range(8):
+                if byte & (1 << bit):
+                    yield (byte_index << 3) + bit
+
+    def __len__(self):
+        return sum(bin(byte).count("1") for byte in self.bits)
+
+    @staticmethod
+    def key(file_name, definition, num_entries=None):
+        # the key changes whenever the input file, the selection or the number of processed entries changes
+        stat = os.stat(file_name)
+        key = hashlib.sha1()
+        key.update(os.path.abspath(file_name))
+        key.update(str(stat.st_size))
+        key.update(str(int(stat.st_mtime)))
+        key.update(definition)
+        if num_entries is not None:
+            key.update(str(num_entries))
+        return key.hexdigest()
+
+    @staticmethod
+    # next to the input file, or in directory if it is given
+    def sidecar_path(file_name, key, extension=".entrylist", directory=None):
+        if directory is not None:
+            file_name = os.path.join(directory, os.path.basename(file_name))
+        return file_name + "." + key[:16] + extension
+
+    def save(self, path, key):
+        with open(path, "wb") as f:
+            f.write(" ".join([EntryList.magic, key, str(self.num_entries)]) + "\n")
+            f.write(self.bits)
+
+    @staticmethod
+    def load(path, key):
+        if not os.path.isfile(path):
+            return None
+
+        with open(path, "rb") as f:
+            header = f.readline().split()
+            if len(header) != 3 or header[0] != EntryList.magic or header[1] != key:
+                return None
+            num_entries = int(header[2])
+            bits = bytearray(f.read())
+
+        if len(bits) != (num_entries + 7) // 8:
+            return None
+
+        return EntryList(num_entries, bits)
@@ -12,6 +12,7 @@ import argparse
 # other modules
 from plotwrapper import *
 from numpyarray import numpyarray
+from tagandprobe import TagAndProbe
 
 def isclose(a, b, rel_tol=1e-09, abs_tol=0.0):
     return abs(a-b) <= max(rel_tol * max(abs(a), abs(b)), abs_tol)
@@ -24,6 +25,7 @@ parser.add_argument('-f', metavar='inputFile', type=str, nargs=1, help='Input RO
 parser.add_argument('-n', metavar='numEvents', type=int, nargs=1, help='Number of events to process (default all)')
 # parser.add_argument('-p', metavar='plotDirectory', type=str, nargs=1, help='Directory Name for the final Plot Image')
 parser.add_argument('-mc', action="store_true", help='Indicates the processed file is a monte-carlo file')
+parser.add_argument('-phi', action="store_true", help='Bin the efficiency map in phi as well as in pt and eta')
 
 args = parser.parse_args()
 fileName = str(args.f[0])
@@ -127,93 +129,8 @@ weight = "mcWeight" if args.mc else None
 
 # print entries_left
 
-plots = [
-    Plot(myChain, "lep_pt", True, "lep_pt", "x", "y", 100, 0, 300e3),
-    Plot(myChain, "lep_eta", True, "lep_eta", "x", "y", 50, -3.5, 3.5),
-    Plot(myChain, "lep_phi", True, "lep_phi", "x", "y", 50, -3.5, 3.5),
-    Plot(myChain, "lep_E", True, "lep_E", "x", "y", 100, 0, 500e3),
-    Plot(myChain, "vxp_z", False, "vxp_z", "x", "y", 1000, -500, 500),
-    Plot(myChain, "lep_n", False, "lep_n", "x", "y", 10, 0, 10),
-    Plot(myChain, "lep_ptcone30", True, "lep_ptcone30", "x", "y", 500, 0, 170e4),
-    Plot(myChain, "lep_etcone20", True, "lep_etcone20", "x", "y", 100, 0, 500e3)
-]
-
-eff_num = {}
-eff_den = {}
-plot_num = Plot(myChain, "eff_num", False, "eff_num", "x", "y", 100, 0, 300e3)
-plot_den = Plot(myChain, "eff_den", False, "eff_den", "x", "y", 100, 0, 300e3)
-
-def inc_dict(d, key, val=1):
-    if key in d:
-        d[key] += val
-    else:
-        d[key] = val
-
-
-def selector(data_item, chain):
-    global eff_num
-    global eff_den
-    def data_pass():
-        inc_dict(eff_num, pt[0])
-        return data_item
-
-    def data_fail():
-        return None
-
-    if not chain.trigE:
-        return data_fail()
-
-    if not chain.passGRL:
-        return data_fail()
-
-    if not chain.hasGoodVertex:
-        return data_fail()
-
-    if chain.lep_n < 2:
-        return data_fail()
-
-    allowed_types = (11,)
-    types = list(chain.lep_type)
-    if types[0] not in allowed_types:
-        return data_fail()
-
-    charges = list(chain.lep_charge)
-    if not isclose(charges[0], -1) and not isclose(charges[0], +1):
-        return data_fail()
-
-    pt = list(chain.lep_pt)
-    if pt[0] < 25e3:
-        return data_fail()
-
-    ptcone = list(chain.lep_ptcone30)
-    if ptcone[0] / pt[0] > 0.15:
-        return data_fail()
-
-    etcone = list(chain.lep_etcone20)
-    E = list(chain.lep_E)
-    if etcone[0] / E[0] > 0.15:
-        return data_fail()
-
-    flags = list(chain.lep_flag)
-    if not flags[0] & (1 << 9):
-        return data_fail()
-
-    # first electron passed all tests
-    inc_dict(eff_den, pt[0])
-    inc_dict(eff_num, pt[0], 0)
-
-    # if types[1] not in allowed_types:
-    #     return data_fail()
-
-    # if not charges[0] * charges[1] == -1:
-    #     return data_fail()
-
-    if not flags[1] & (1 << 9):
-        return data_fail()
-
-    return data_pass()
-    
-
+# the tight id efficiency of the second electron against the first one, see tagandprobe.py
+tag_and_probe = TagAndProbe(phi=args.phi)
 
 # def selector(data_item, chain):
 #     def data_pass():
@@ -275,27 +192,11 @@ def selector(data_item, chain):
 num_entries = -1
 
 
-plots[0].acquire_entries(num_entries=num_entries, selector=selector, weight=weight)
+EventLoop(myChain, weight=weight, consumers=[tag_and_probe]).run(num_entries)
 # plots[0].draw_and_save(save_path + "lep_pt.png", which=(0,1), log_scale=(0, 1))
 
 
-plot_num.acquire_from_dict(eff_num)
-plot_den.acquire_from_dict(eff_den)
-
-efficiency = {}
-for key in eff_den.keys():
-    efficiency[key] = float(eff_num[key]) / float(eff_den[key])
-
-plot_eff = Plot(myChain, "eff", False, "eff", "x", "y", 100, 0, 300e3)
-# plot_eff.acquire_from_dict(efficiency)
-
-plot_eff.hist = plot_num.hist / plot_den.hist
-
-name_suffix = "_mc" if args.mc else ""
-
-plot_num.draw_and_save("num" + name_suffix + ".png", which=(0,), log_scale=(0, 0))
-plot_den.draw_and_save("den" + name_suffix + ".png", which=(0,), log_scale=(0, 0))
-plot_eff.draw_and_save("eff" + name_suffix + ".png", which=(0,), log_scale=(0, 0))
+tag_and_probe.save(myfile.GetName(), args.mc)
 
 
 
@@ -485,4 +386,6 @@ plot_eff.draw_and_save("eff" + name_suffix + ".png", which=(0,), log_scale=(0, 0
 #useful command to pause the execution of the code. Allows to see the plot before python finishes
 # ROOT.TPython.Prompt()
 
-raw_input("Press Enter to Quit.")
+# only wait when run interactively, jobs started by run_all_eff.py have no terminal to answer the prompt
+if sys.stdin.isatty():
+    raw_input("Press Enter to Quit.")
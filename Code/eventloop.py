@@ -5,6 +5,7 @@ import math
 import sys
 import os
 import os.path
+import numpy
 
 # The argparse module makes it easy to write user-friendly command-line interfaces.
 import argparse
@@ -12,6 +13,10 @@ import argparse
 # other modules
 from plotwrapper import *
 from numpyarray import numpyarray
+from selection import z_selection
+import fourvector
+from skim import write_skim, write_sum_of_weights, read_sum_of_weights
+from tagandprobe import TagAndProbe
 
 
 def isclose(a, b, rel_tol=1e-09, abs_tol=0.0):
@@ -26,6 +31,14 @@ parser.add_argument('-n', metavar='numEvents', type=int, nargs=1, help='Number o
 parser.add_argument('-p', metavar='plotDirectory', type=str, nargs=1, help='Directory Name for the final Plot Image')
 parser.add_argument('-t', metavar='lepton_type', type=str, nargs=1, help='The type of lepton to be analyzed')
 parser.add_argument('-mc', action="store_true", help='Indicates the processed file is a monte-carlo file')
+parser.add_argument('-columnar', action="store_true", help='Evaluate the selection vectorized on whole branches before the event loop')
+parser.add_argument('-branches', metavar='branch', type=str, nargs='+', help='Read these branches in addition to the ones used by the plots, selection and weight, e.g. to keep them in a skim')
+parser.add_argument('-j', metavar='processes', type=int, nargs=1, help='Number of worker processes for the event loop (default 1)')
+parser.add_argument('-s', action="store_true", help='Write the selected events with the used branches to skim_<inputFile> for fast re-analysis')
+parser.add_argument('-nocache', action="store_true", help='Do not read or write the cached selection next to the input file')
+parser.add_argument('-cachedir', metavar='cacheDirectory', type=str, nargs=1, help='Directory for the cached selection (default next to the input file)')
+parser.add_argument('-notp', action="store_true", help='Do not measure the tag and probe electron efficiency in the same loop (electron samples only, never done for skims)')
+parser.add_argument('-phi', action="store_true", help='Bin the tag and probe efficiency map in phi as well as in pt and eta')
 
 args = parser.parse_args()
 fileName = str(args.f[0])
@@ -77,62 +90,8 @@ outfile.cd()
 
 # Book histograms within the output file
 
-# max_entries = myChain.GetEntriesFast()
-# segment_entries = max_entries // 100
-
 weight = "mcWeight" if args.mc else None
 
-# entries_left = []
-
-# def append_or_add(l, i, val):
-#     if len(l) <= i:
-#         l.append(val)
-#     else:
-#         l[i] += val
-
-# for i in range(100):
-#     print "overall progress: ", i, "%"
-#     entries = range(i * segment_entries, (i + 1) * segment_entries)
-    
-#     data = EventData(myChain).acquire_entries(entries)
-    
-#     # all values
-#     append_or_add(entries_left, 0, len(data))
-#     # trigger
-#     data.filter(lambda entry: entry.trigE)
-#     append_or_add(entries_left, 1, len(data))
-#     # good run list
-#     data.filter(lambda entry: entry.passGRL)
-#     append_or_add(entries_left, 2, len(data))
-#     # good vertex
-#     data.filter(lambda entry: entry.hasGoodVertex)
-#     append_or_add(entries_left, 3, len(data))
-#     # 2 leptons
-#     data.filter(lambda entry: entry.lep_n >= 2)
-#     append_or_add(entries_left, 4, len(data))
-#     # electron or muon (PDGID)
-#     data.filter(lambda entry: entry.lep_type[0] in (11,) and entry.lep_type[1] in (11,))
-#     append_or_add(entries_left, 5, len(data))
-#     # opposite charge
-#     data.filter(lambda entry: isclose(entry.lep_charge[0] * entry.lep_charge[1], -1.0))
-#     append_or_add(entries_left, 6, len(data))
-#     # pt cut
-#     data.filter(lambda entry: entry.lep_pt[0] > 25e3 and entry.lep_pt[1] > 25e3)
-#     append_or_add(entries_left, 7, len(data))
-#     # et isolation
-#     data.filter(lambda entry: entry.lep_etcone20[0] / entry.lep_E[0] < 0.15 and entry.lep_etcone20[1] / entry.lep_E[1] < 0.15)
-#     append_or_add(entries_left, 8, len(data))
-#     # pt isolation
-#     data.filter(lambda entry: entry.lep_ptcone30[0] / entry.lep_pt[0] < 0.15 and entry.lep_ptcone30[1] / entry.lep_pt[1] < 0.15)
-#     append_or_add(entries_left, 9, len(data))
-#     # tight id
-#     data.filter(lambda entry: entry.lep_flag[0] & 1 << 9 and entry.lep_flag[1] & 1 << 9)
-#     append_or_add(entries_left, 10, len(data))
-    
-#     print entries_left
-
-# print entries_left
-
 plots = [
     Plot(myChain, "lep_pt", True, "lep_pt", "x", "y", 100, 0, 300e3),
     Plot(myChain, "lep_eta", True, "lep_eta", "x", "y", 50, -3.5, 3.5),
@@ -145,79 +104,48 @@ plots = [
 ]
 
 def opposite_charges(c1, c2):
-    return math.is_close(c1, -c2)
-
-
-def selector(data_item, chain):
-    def data_pass():
-        return data_item
-
-    def data_fail():
-        return None
-
-    if analyze_type == "e" and not chain.trigE:
-        return data_fail()
-
-    if analyze_type == "m" and not chain.trigM:
-        return data_fail()
-
-    if not chain.passGRL:
-        return data_fail()
-
-    if not chain.hasGoodVertex:
-        return data_fail()
+    return isclose(c1, -c2)
 
-    # two leptons
-    if chain.lep_n < 2:
-        return data_fail()
 
-    # two highest energy leptons must be electron (11), muon (13) or tau (15)
-    allowed_type = None
-    if analyze_type == "e":
-        allowed_type = 11
-    elif analyze_type == "m":
-        allowed_type = 13
-    elif analyze_type == "t":
-        allowed_type = 15
-    else:
-        raise ValueError("Invalid Type")
+selector = z_selection(analyze_type, weight)
 
-    types = list(chain.lep_type)
-    if types[0] != allowed_type or types[1] != allowed_type:
-        return data_fail()
+num_entries = numEvents
 
-    # two highest energy leptons must have opposite charge
-    charges = list(chain.lep_charge)
-    if not math.is_close(charges[0], -charges[1]):
-        return data_fail()
+# fill all plots in a single pass over the tree
+loop = EventLoop(myChain, plots, selector=selector, weight=weight, branches=args.branches)
+# skims written by this script carry the sum of weights of the full sample, analysis inputs do not
+input_sum_of_weights = read_sum_of_weights(myfile)
+is_skim = input_sum_of_weights is not None
 
-    # transverse momentum of the first two leptons must be at least 25GeV
-    pt = list(chain.lep_pt)
-    if pt[0] < 25e3 or pt[1] < 25e3:
-        return data_fail()
+# the efficiency measurement of eventloop.eff.py shares the read of the electron samples
+# a skim only holds selected events, its efficiencies would be close to 1 and overwrite the real ones
+tag_and_probe = None
+if analyze_type == "e" and not args.notp and not is_skim:
+    tag_and_probe = loop.add_consumer(TagAndProbe(phi=args.phi))
+if not args.nocache:
+    loop.cache_selection(fileName, selector.definition(), num_entries, args.cachedir[0] if args.cachedir != None else None)
+if args.columnar:
+    loop.select_columnar(num_entries)
+loop.run(num_entries, processes=args.j[0] if args.j != None else 1)
 
-    # Momentum Isolation
-    ptcone = list(chain.lep_ptcone30)
-    if ptcone[0] / pt[0] > 0.15 or ptcone[1] / pt[1] > 0.15:
-        return data_fail()
+print selector.cutflow.table()
 
-    # Energy Isolation
-    etcone = list(chain.lep_etcone20)
-    E = list(chain.lep_E)
-    if etcone[0] / E[0] > 0.15 or etcone[1] / E[1] > 0.15:
-        return data_fail()
-
-    # check the 9th bit flag (tight detector selection)
-    flags = list(chain.lep_flag)
-    if not flags[0] & (1 << 9) or not flags[1] & (1 << 9):
-        return data_fail()
-
-    return data_pass()
-    
-num_entries = -1
+# the sum of weights of all read entries, selected or not, normalizes the MC samples in plot.py
+# a skim only holds selected entries, its stored sum of weights of the full sample is passed on instead
+sum_of_weights = input_sum_of_weights
+if sum_of_weights is None:
+    sum_of_weights = (loop.sumw_entries, loop.sumw, loop.sumw2)
+else:
+    print "Using the sum of weights of the full sample stored in", myfile.GetName()
+print "Sum of weights of %d entries: %g (sum of squares %g)" % sum_of_weights
+write_sum_of_weights(outfile, *sum_of_weights)
+selector.cutflow.save("cutflow_" + myfile.GetName().split('/')[-1].replace(".root", ".json"))
 
+if args.s:
+    # the skim can be passed to this script, plot.py or fit.py instead of the full file
+    write_skim(myChain, loop.entry_list, loop.branches(), "skim_" + myfile.GetName().split('/')[-1], sum_of_weights)
+    outfile.cd()
 
-plots[0].acquire_entries(num_entries=num_entries, selector=selector, weight=weight)
 plots[0].draw_and_save(save_path + "lep_pt.png", which=(0,1), log_scale=(0, 1))
 
 # plots[0].draw(which=(0,))
@@ -228,7 +156,7 @@ plots[0].draw_and_save(save_path + "lep_pt.png", which=(0,1), log_scale=(0, 1))
 #
 # plots[0].draw(False, which=(1,))
 
-pt1 = numpyarray([x[0] for x in plots[0].data])
+pt1 = plots[0].data.leading(0)
 
 # for i in range(100):
 #     print pt1[i]
@@ -238,9 +166,8 @@ pt1_plot.acquire_from_data(pt1)
 
 pt1_plot.draw(which=(0,))
 
-plots[6].acquire_entries(num_entries=num_entries, selector=selector, weight=weight)
 
-pt1_cone30 = numpyarray([x[0] for x in plots[6].data])
+pt1_cone30 = plots[6].data.leading(0)
 pt1_iso = pt1_cone30 / pt1
 pt1_iso_plot = Plot(myChain, "pt1_iso", False, "pt1 isolation", "x", "y", 500, 0, 1)
 pt1_iso_plot.acquire_from_data(pt1_iso)
@@ -248,9 +175,9 @@ pt1_iso_plot.draw_and_save(save_path + "pt1_iso.png", log_scale=(0, 1))
 
 # print(plots[0].data[0:100])
 
-pt2 = numpyarray([x[1] for x in plots[0].data])
+pt2 = plots[0].data.leading(1)
 
-pt2_cone30 = numpyarray([x[1] for x in plots[6].data])
+pt2_cone30 = plots[6].data.leading(1)
 pt2_iso = pt2_cone30 / pt2
 pt2_iso_plot = Plot(myChain, "pt2_iso", False, "pt2 isolation", "x", "y", 500, 0, 1)
 pt2_iso_plot.acquire_from_data(pt2_iso)
@@ -261,22 +188,20 @@ print "pt2 =", pt2.mean()
 
 # raw_input()
 
-plots[1].acquire_entries(num_entries=num_entries, selector=selector, weight=weight)
 plots[1].draw_and_save(save_path + "lep_eta.png", which=(0,1), log_scale=(0, 0))
 
-eta1 = numpyarray([x[0] for x in plots[1].data])
-eta2 = numpyarray([x[1] for x in plots[1].data])
+eta1 = plots[1].data.leading(0)
+eta2 = plots[1].data.leading(1)
 
 print "eta1 =", eta1.mean()
 print "eta2 =", eta2.mean()
 
 # raw_input()
 
-plots[2].acquire_entries(num_entries=num_entries, selector=selector, weight=weight)
 plots[2].draw_and_save(save_path + "lep_phi.png", which=(0,1), log_scale=(0, 0))
 
-phi1 = numpyarray([x[0] for x in plots[2].data])
-phi2 = numpyarray([x[1] for x in plots[2].data])
+phi1 = plots[2].data.leading(0)
+phi2 = plots[2].data.leading(1)
 
 print "phi1 =", phi1.mean()
 print "phi2 =", phi2.mean()
@@ -285,34 +210,30 @@ print "phi2 =", phi2.mean()
 
 M = numpyarray.sqrt(2 * pt1 * pt2 * (numpyarray.cosh(eta1 - eta2) - numpyarray.cos(phi1 - phi2)))
 
-# mass selection
-temp = len(M)
-M = numpyarray(filter(lambda x: 70e3 <= x <= 110e3, M))
-del temp
+# mass selection, stored with the masses because unbinned fits have to be normalized over the same range
+mass_range = (70e3, 110e3)
+mass_window = (M.data >= mass_range[0]) & (M.data <= mass_range[1])
+M = M[mass_window]
 
 # print "Len M:", len(M)
 
 m_plot = Plot(None, "M", False, "Invariant Mass M of two leading Leptons", "M_ll / MeV", "counts", 300, 70e3, 130e3)
 m_plot.acquire_from_data(M)
 
-plots[3].acquire_entries(num_entries=num_entries, selector=selector, weight=weight)
 # plots[3].draw_and_save(save_path + "lep_E.png")
 
-plots[4].acquire_entries(num_entries=num_entries, selector=selector, weight=weight)
 plots[4].draw_and_save(save_path + "vxp_z.png")
 
 
-plots[5].acquire_entries(num_entries=num_entries, selector=selector, weight=weight)
 plots[5].draw_and_save(save_path + "lep_n.png", log_scale=(0, 1))
 
 
-E1 = numpyarray([x[0] for x in plots[3].data])
-E2 = numpyarray([x[1] for x in plots[3].data])
+E1 = plots[3].data.leading(0)
+E2 = plots[3].data.leading(1)
 
-plots[7].acquire_entries(num_entries=num_entries, selector=selector, weight=weight)
 
-Et1_cone20 = numpyarray([x[0] for x in plots[7].data])
-Et2_cone20 = numpyarray([x[1] for x in plots[7].data])
+Et1_cone20 = plots[7].data.leading(0)
+Et2_cone20 = plots[7].data.leading(1)
 
 Et1_iso = Et1_cone20 / E1
 Et2_iso = Et2_cone20 / E2
@@ -328,38 +249,16 @@ Et1_iso_plot.draw_and_save(save_path + "Et1_iso.png", which=(0,), log_scale=(0,
 Et2_iso_plot.draw_and_save(save_path + "Et2_iso.png", which=(0,), log_scale=(0, 1))
 
 
-vec1 = numpyarray([])
-vec2 = numpyarray([])
-
-
-for i in range(len(pt1)):
-    pt = pt1[i]
-    eta = eta1[i]
-    phi = phi1[i]
-    E = E1[i]
-    lorentz_vec = ROOT.TLorentzVector()
-    lorentz_vec.SetPtEtaPhiE(pt, eta, phi, E)
-    vec1.append(lorentz_vec)
-
-for i in range(len(pt2)):
-    pt = pt2[i]
-    eta = eta2[i]
-    phi = phi2[i]
-    E = E2[i]
-    lorentz_vec = ROOT.TLorentzVector()
-    lorentz_vec.SetPtEtaPhiE(pt, eta, phi, E)
-    vec2.append(lorentz_vec)
-
-M_vec = numpyarray([])
-
-for i in range(len(vec1)):
-    v1 = vec1[i]
-    v2 = vec2[i]
-
-    M_vec.append((v1 + v2).M())
+M_vec, pt_ll, y_ll, dR_ll = fourvector.pair(pt1, eta1, phi1, E1, pt2, eta2, phi2, E2)
 
 print "M_vec =", M_vec.mean()
 
+# the masses of all selected events with their weights, for unbinned fits with fit.py
+event_weights = plots[0].weights.data
+numpy.savez("masses_" + myfile.GetName().split('/')[-1].replace(".root", ".npz"),
+            M=M.data, M_weights=event_weights[mass_window], M_window=numpy.array(mass_range),
+            M_vec=M_vec.data, M_vec_weights=event_weights)
+
 M_vec_plot = Plot(None, "M_vec", False, "Invariant Mass M_vec of two leading Leptons", "M_ll / MeV", "counts", 300, 70e3, 130e3)
 M_vec_plot.acquire_from_data(M_vec)
 M_vec_plot.draw_and_save(save_path + "M_vec.png", log_scale=(0, 0))
@@ -403,6 +302,10 @@ outfile.cd()
 print "Writing output to %s"%outfile.GetName()
 outfile.Write()
 
+# the tag and probe plots and efficiency map are extras, they are written after the main output
+if tag_and_probe is not None:
+    tag_and_probe.save(myfile.GetName(), args.mc, save_path)
+
 #useful command to pause the execution of the code. Allows to see the plot before python finishes
 # ROOT.TPython.Prompt()
 
@@ -0,0 +1,76 @@
+import sys
+import os.path
+import csv
+import argparse
+import multiprocessing
+
+from lineshape import models, start_values, load_masses, fit_range, fit
+
+# fits the line shape models to the M histograms (or masses_*.npz) of many samples, each (sample, model) fit in a worker
+# e.g.   python fit_all.py -f analysis_DataEgamma.root analysis_mc_147770.Zee.root -j 4 -o fits.csv
+parser = argparse.ArgumentParser(description='Fit the Z line shape models to many samples.')
+parser.add_argument('-f', metavar='inputFile', type=str, nargs='+', help='Analysis outputs, skims or masses_*.npz files (default the analysis outputs of run_all.py)')
+parser.add_argument('-models', metavar='model', type=str, nargs='+', help='Models to fit (default gauss bw conv)')
+parser.add_argument('-j', metavar='processes', type=int, nargs=1, help='Number of worker processes (default number of cores)')
+parser.add_argument('-o', metavar='outputFile', type=str, nargs=1, help='CSV file for the results (default fits.csv)')
+
+mMin = 70.0e3
+mMax = 130.0e3
+
+default_files = ["analysis_DataEgamma.root", "analysis_DataMuons.root", "analysis_mc_147770.Zee.root",
+                 "analysis_mc_147771.Zmumu.root", "analysis_mc_147772.Ztautau.root"]
+
+# the masses of every input are read once per worker process
+_inputs = {}
+
+
+def fit_sample(task):
+    path, name = task
+    if path not in _inputs:
+        _inputs[path] = load_masses(path) + fit_range(path, "M", mMin, mMax)
+    histogram, masses, weights, xmin, xmax = _inputs[path]
+
+    model = models[name]
+    result = fit(model, start_values(name, histogram.sumw[1:-1].sum()), histogram, masses, weights, xmin, xmax)
+    return path, name, model.parameters, result.values, result.errors, result.fval, result.ndf, result.status
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    files = args.f if args.f != None else [f for f in default_files if os.path.isfile(f)]
+    names = args.models if args.models != None else ["gauss", "bw", "conv"]
+    processes = args.j[0] if args.j != None else multiprocessing.cpu_count()
+    output = args.o[0] if args.o != None else "fits.csv"
+
+    for name in names:
+        if name not in models:
+            sys.exit("Error: Unknown model " + name)
+    for path in files:
+        if not os.path.isfile(path):
+            sys.exit("Error: Input file " + path + " does not exist")
+
+    tasks = [(path, name) for path in files for name in names]
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(fit_sample, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    # the mass and the width of every fit, with the width of the Gaussian for the gauss model
+    # the chi2/NDF column holds -2 ln L / NDF for the unbinned fits of masses_*.npz files
+    print "%-35s %-6s %12s %9s %10s %9s %10s %7s" % ("sample", "model", "M / GeV", "error", "width", "error", "chi2/NDF", "status")
+    for path, name, parameters, values, errors, fval, ndf, status in results:
+        print "%-35s %-6s %12.4f %9.4f %10.4f %9.4f %10.3f %7d" % (os.path.basename(path), name, values[1] * 1e-3, errors[1] * 1e-3,
+                                                                 values[2] * 1e-3, errors[2] * 1e-3, fval / ndf if ndf > 0 else 0.0, status)
+
+    with open(output, "w") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sample", "model", "parameter", "value", "error", "fval", "ndf", "status"])
+        for path, name, parameters, values, errors, fval, ndf, status in results:
+            for parameter, value, error in zip(parameters, values, errors):
+                writer.writerow([os.path.basename(path), name, parameter, value, error, fval, ndf, status])
+    print "Writing results to", output
+
+    if any(result[-1] != 0 for result in results):
+        sys.exit("Error: Not all fits converged")
@@ -0,0 +1,55 @@
+import numpy
+
+from numpyarray import numpyarray
+
+
+# cartesian components as ROOT's TLorentzVector.SetPtEtaPhiE computes them
+def components(pt, eta, phi, E):
+    pt = numpy.abs(numpy.asarray(pt, dtype=numpy.float64))
+    eta = numpy.asarray(eta, dtype=numpy.float64)
+    phi = numpy.asarray(phi, dtype=numpy.float64)
+    E = numpy.asarray(E, dtype=numpy.float64)
+    return pt * numpy.cos(phi), pt * numpy.sin(phi), pt * numpy.sinh(eta), E
+
+
+# like TLorentzVector.M, negative mass squares give negative masses
+def mass(px, py, pz, E):
+    m2 = E * E - (px * px + py * py + pz * pz)
+    return numpy.sign(m2) * numpy.sqrt(numpy.abs(m2))
+
+
+# like TVector2.Phi_mpi_pi
+def delta_phi(phi1, phi2):
+    dphi = numpy.asarray(phi1, dtype=numpy.float64) - numpy.asarray(phi2, dtype=numpy.float64)
+    return numpy.mod(dphi + numpy.pi, 2 * numpy.pi) - numpy.pi
+
+
+def delta_r(eta1, phi1, eta2, phi2):
+    deta = numpy.asarray(eta1, dtype=numpy.float64) - numpy.asarray(eta2, dtype=numpy.float64)
+    return numpy.sqrt(deta * deta + delta_phi(phi1, phi2) ** 2)
+
+
+# kinematics of the sum of two particles given by pt/eta/phi/E columns
+# returns the invariant mass, pt and rapidity of the pair and the delta R between the two particles
+def pair(pt1, eta1, phi1, E1, pt2, eta2, phi2, E2):
+    px1, py1, pz1, e1 = components(pt1, eta1, phi1, E1)
+    px2, py2, pz2, e2 = components(pt2, eta2, phi2, E2)
+
+    px = px1 + px2
+    py = py1 + py2
+    pz = pz1 + pz2
+    E = e1 + e2
+
+    M = mass(px, py, pz, E)
+    pt = numpy.hypot(px, py)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        rapidity = 0.5 * numpy.log((E + pz) / (E - pz))
+    dR = delta_r(eta1, phi1, eta2, phi2)
+
+    return numpyarray(M), numpyarray(pt), numpyarray(rapidity), numpyarray(dR)
+
+
+def invariant_mass(pt1, eta1, phi1, E1, pt2, eta2, phi2, E2):
+    px1, py1, pz1, e1 = components(pt1, eta1, phi1, E1)
+    px2, py2, pz2, e2 = components(pt2, eta2, phi2, E2)
+    return numpyarray(mass(px1 + px2, py1 + py2, pz1 + pz2, e1 + e2))
@@ -0,0 +1,69 @@
+import os
+import os.path
+import subprocess
+import time
+
+
+# a command run as a separate process with its output written to a log file
+class Job(object):
+    def __init__(self, name, command, log_name):
+        self.name = name
+        self.command = command
+        self.log_name = log_name
+        self.log_path = None
+        self.process = None
+        self.log = None
+        self.stdin = None
+        self.start_time = None
+        self.wall_time = None
+        self.returncode = None
+
+    def start(self):
+        self.log = open(self.log_path, "w")
+        self.start_time = time.time()
+        # jobs run in the background, they must not wait for input from the terminal
+        self.stdin = open(os.devnull)
+        self.process = subprocess.Popen(self.command, stdin=self.stdin, stdout=self.log, stderr=subprocess.STDOUT)
+
+    def poll(self):
+        if self.process.poll() is None:
+            return False
+
+        self.returncode = self.process.returncode
+        self.wall_time = time.time() - self.start_time
+        self.log.close()
+        self.stdin.close()
+        return True
+
+
+# runs the jobs with at most max_workers at the same time and prints a summary of exit status and wall time
+def run_jobs(jobs, max_workers, log_dir="logs", poll_interval=0.5):
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+
+    pending = list(jobs)
+    running = []
+
+    start_time = time.time()
+    while pending or running:
+        while pending and len(running) < max_workers:
+            job = pending.pop(0)
+            job.log_path = os.path.join(log_dir, job.log_name)
+            print "Starting", job.name, ":", " ".join(job.command)
+            job.start()
+            running.append(job)
+
+        time.sleep(poll_interval)
+
+        for job in list(running):
+            if job.poll():
+                running.remove(job)
+                print "Finished", job.name, "with exit status", job.returncode, "after %.1f s" % job.wall_time
+
+    print
+    print "%-20s %8s %12s  %s" % ("job", "status", "wall time", "log")
+    for job in jobs:
+        print "%-20s %8d %10.1f s  %s" % (job.name, job.returncode, job.wall_time, job.log_path)
+    print "total wall time: %.1f s" % (time.time() - start_time)
+
+    return all(job.returncode == 0 for job in jobs)
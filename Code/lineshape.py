@@ -0,0 +1,336 @@
+import math
+from array import array
+
+import ROOT
+import numpy
+
+from plotwrapper import Histogram
+from skim import get_histogram, mass_histograms
+
+
+# the fit functions of fit.py, evaluated on whole arrays of x at once
+# invalid parameters (e.g. a width of 0) give 0 like the except branches of the per-point functions
+def _finite(values):
+    values[~numpy.isfinite(values)] = 0
+    return values
+
+
+def gauss(x, par):
+    N, m, s = par[0], par[1], par[2]
+    x = numpy.asarray(x, dtype=numpy.float64)
+    with numpy.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        chi2 = (x - m) * (x - m) / (s * s)
+        return _finite(N / numpy.sqrt(2 * math.pi * s * s) * numpy.exp(-0.5 * chi2))
+
+
+# relativistic Breit-Wigner, see https://en.wikipedia.org/wiki/Relativistic_Breit%E2%80%93Wigner_distribution
+def bw(x, par):
+    N, M, Gamma = par[0], par[1], par[2]
+    x = numpy.asarray(x, dtype=numpy.float64)
+    with numpy.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        gamma = math.sqrt(M * M * (M * M + Gamma * Gamma))
+        k = 2 * math.sqrt(2) * M * Gamma * gamma / (math.pi * math.sqrt(M * M + gamma))
+        return _finite(N * k / ((x * x - M * M) ** 2 + M * M * Gamma * Gamma))
+
+
+class Model(object):
+    def __init__(self, name, parameters, function, fixed=()):
+        self.name = name
+        self.parameters = parameters
+        self.function = function
+        # parameters kept fixed in fits unless asked otherwise
+        self.fixed = fixed
+
+    def __call__(self, x, par):
+        return self.function(x, par)
+
+
+# Breit-Wigner (parameters 0-2) convolved with a Gaussian (parameters 3-5), like fConv of fit.py
+# the Breit-Wigner is sampled on a fixed grid over the range TF1Convolution uses and transformed with an FFT,
+# which is multiplied with the analytic Fourier transform of the Gaussian, the result is interpolated at x
+# the grid and frequencies are computed once, the transform of the Breit-Wigner is reused while only the
+# Gaussian parameters change and the last result is reused for repeated calls with the same parameters
+class ConvolutionModel(Model):
+    def __init__(self, t_min=-20.0e3, t_max=130.0e3, points=10000):
+        Model.__init__(self, "conv", ["N", "M", "Gamma", "N_gauss", "m_gauss", "s"], None, fixed=(3, 4))
+        self.t = numpy.linspace(t_min, t_max, points)
+        dt = self.t[1] - self.t[0]
+
+        # zero padding to at least twice the grid keeps the cyclic FFT convolution from wrapping around
+        self.fft_size = 1
+        while self.fft_size < 2 * points:
+            self.fft_size *= 2
+        self.frequencies = numpy.fft.rfftfreq(self.fft_size, dt)
+
+        self._bw_par = None
+        self._bw_fft = None
+        self._par = None
+        self._grid = None
+
+    # the convolution on the grid points
+    def grid(self, par):
+        par = tuple(float(p) for p in par)
+        if par == self._par:
+            return self._grid
+
+        if par[0:3] != self._bw_par:
+            self._bw_par = par[0:3]
+            self._bw_fft = numpy.fft.rfft(bw(self.t, par[0:3]), self.fft_size)
+
+        N_gauss, m_gauss, s = par[3:6]
+        if s == 0:
+            # like the per-point Gaussian, a width of 0 gives 0
+            grid = numpy.zeros(len(self.t))
+        else:
+            f = self.frequencies
+            gauss_fft = N_gauss * numpy.exp(-2j * math.pi * f * m_gauss - 2 * (math.pi * s * f) ** 2)
+            grid = numpy.fft.irfft(self._bw_fft * gauss_fft, self.fft_size)[:len(self.t)]
+
+        self._par = par
+        self._grid = grid
+        return grid
+
+    def __call__(self, x, par):
+        return numpy.interp(numpy.asarray(x, dtype=numpy.float64), self.t, self.grid(par))
+
+
+models = {
+    "gauss": Model("gauss", ["N", "m", "s"], gauss),
+    "bw": Model("bw", ["N", "M", "Gamma"], bw),
+    "conv": ConvolutionModel(),
+}
+
+
+class FitResult(object):
+    def __init__(self, model, values, errors, fval, ndf, status):
+        self.model = model
+        self.values = values
+        self.errors = errors
+        # chi2 or -2 ln L at the minimum
+        self.fval = fval
+        self.ndf = ndf
+        self.status = status
+
+    def GetParameter(self, i):
+        return self.values[i]
+
+    def GetParError(self, i):
+        return self.errors[i]
+
+    def GetChisquare(self):
+        return self.fval
+
+    def GetNDF(self):
+        return self.ndf
+
+    def __repr__(self):
+        return self.model.name + " " + " ".join("%s=%g+-%g" % (name, value, error) for name, value, error in zip(self.model.parameters, self.values, self.errors))
+
+
+# minimizes fcn(par) with MIGRAD of TMinuit, parameters in fixed are kept at their start values
+# returns the parameter values, their errors, the minimum and the MIGRAD status
+def minimize(fcn, names, start, steps=None, fixed=(), error_def=1.0, max_calls=10000, tolerance=0.1):
+    npar = len(names)
+    # MIGRAD refuses to run without free parameters, e.g. for scans of the unbinned Breit-Wigner fit
+    if len(set(fixed)) >= npar:
+        return list(start), [0.0] * npar, fcn(list(start)), 0
+
+    if steps is None:
+        steps = [0.1 * abs(value) if value != 0 else 0.1 for value in start]
+
+    minuit = ROOT.TMinuit(npar)
+    minuit.SetPrintLevel(-1)
+    minuit.SetErrorDef(error_def)
+
+    def _fcn(npar, gin, f, par, iflag):
+        f[0] = fcn([par[i] for i in range(len(names))])
+    minuit.SetFCN(_fcn)
+
+    ierflg = ROOT.Long(0)
+    for i, name in enumerate(names):
+        minuit.mnparm(i, name, start[i], steps[i], 0, 0, ierflg)
+    for i in fixed:
+        minuit.FixParameter(i)
+
+    minuit.mnexcm("MIGRAD", array('d', [max_calls, tolerance]), 2, ierflg)
+    status = int(ierflg)
+
+    values = []
+    errors = []
+    value = ROOT.Double(0)
+    error = ROOT.Double(0)
+    for i in range(npar):
+        minuit.GetParameter(i, value, error)
+        values.append(float(value))
+        errors.append(float(error))
+
+    return values, errors, fcn(values), status
+
+
+# chi2 or binned Poisson likelihood fit of a model to histogram bins in one vectorized call per iteration
+# like TH1::Fit the function is compared at the bin centers and empty bins are left out of the chi2
+class BinnedFit(object):
+    def __init__(self, model, x, y, errors, xmin=None, xmax=None, method="chi2"):
+        x = numpy.asarray(x, dtype=numpy.float64)
+        y = numpy.asarray(y, dtype=numpy.float64)
+        errors = numpy.asarray(errors, dtype=numpy.float64)
+
+        use = numpy.ones(len(x), dtype=bool)
+        if xmin is not None:
+            use &= x >= xmin
+        if xmax is not None:
+            use &= x <= xmax
+        if method == "chi2":
+            use &= errors > 0
+        elif method != "likelihood":
+            raise ValueError("Unknown fit method " + method)
+
+        self.model = model
+        self.method = method
+        self.x = x[use]
+        self.y = y[use]
+        self.errors = errors[use]
+
+    @staticmethod
+    def from_histogram(model, histogram, xmin=None, xmax=None, method="chi2"):
+        inner = slice(1, -1)
+        return BinnedFit(model, histogram.centers()[inner], histogram.sumw[inner], histogram.errors()[inner], xmin, xmax, method)
+
+    def chi2(self, par):
+        residuals = (self.y - self.model(self.x, par)) / self.errors
+        return (residuals * residuals).sum()
+
+    # -2 ln of the Poisson likelihood ratio to the saturated model (Baker-Cousins), minimum values behave like chi2
+    def likelihood(self, par):
+        f = numpy.maximum(self.model(self.x, par), 1e-300)
+        y = self.y
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            log_term = numpy.where(y > 0, y * numpy.log(y / f), 0.0)
+        return 2 * (f - y + log_term).sum()
+
+    def __call__(self, par):
+        if self.method == "chi2":
+            return self.chi2(par)
+        return self.likelihood(par)
+
+    def fit(self, start, fixed=None, steps=None):
+        if fixed is None:
+            fixed = self.model.fixed
+        values, errors, fval, status = minimize(self, self.model.parameters, start, steps, fixed)
+        ndf = len(self.x) - (len(start) - len(fixed))
+        return FitResult(self.model, values, errors, fval, ndf, status)
+
+
+# unbinned maximum likelihood fit of the shape of a model to single masses in [xmin, xmax], optionally weighted
+# the model is normalized numerically over the range, so the normalization parameter 0 is fixed
+# the log-likelihood is summed chunk by chunk, so the temporary arrays stay small for large mass arrays
+class UnbinnedFit(object):
+    chunk_size = 65536
+
+    def __init__(self, model, x, weights=None, xmin=70.0e3, xmax=130.0e3, integration_points=2000):
+        x = numpy.asarray(x, dtype=numpy.float64)
+        if weights is None:
+            weights = numpy.ones(len(x))
+        weights = numpy.asarray(weights, dtype=numpy.float64)
+
+        use = (x >= xmin) & (x <= xmax)
+        self.model = model
+        self.x = x[use]
+        self.weights = weights[use]
+        self.xmin = xmin
+        self.xmax = xmax
+        self.grid = numpy.linspace(xmin, xmax, integration_points)
+
+        self.sumw = self.weights.sum()
+        self.sumw2 = (self.weights * self.weights).sum()
+        # weighted likelihoods are scaled by sum(w) / sum(w^2), so the errors correspond to the effective number of events
+        self.scale = self.sumw / self.sumw2 if self.sumw2 > 0 else 1.0
+
+    def normalization(self, par):
+        return numpy.trapz(self.model(self.grid, par), self.grid)
+
+    # -2 ln L of the weighted events
+    def __call__(self, par):
+        norm = self.normalization(par)
+        if not norm > 0:
+            return 1e300
+
+        total = 0.0
+        for start in range(0, len(self.x), UnbinnedFit.chunk_size):
+            f = self.model(self.x[start:start + UnbinnedFit.chunk_size], par) / norm
+            total += (self.weights[start:start + UnbinnedFit.chunk_size] * numpy.log(numpy.maximum(f, 1e-300))).sum()
+        return -2 * self.scale * total
+
+    def fit(self, start, fixed=None, steps=None):
+        if fixed is None:
+            fixed = self.model.fixed
+        fixed = tuple(sorted(set(fixed) | set([0])))
+        values, errors, fval, status = minimize(self, self.model.parameters, start, steps, fixed)
+        ndf = len(self.x) - (len(start) - len(fixed))
+        return FitResult(self.model, values, errors, fval, ndf, status)
+
+    # parameters with the normalization set, so the model gives the expected counts per bin of the given width
+    def scaled(self, par, bin_width):
+        rv = list(par)
+        rv[0] *= self.sumw * bin_width / self.normalization(par)
+        return rv
+
+
+# start values of the fits in fit.py, integral is the integral of the fitted histogram
+def start_values(name, integral):
+    if name == "gauss":
+        return [integral, 90.0e3, 4.0e3]
+    if name == "bw":
+        return [1.75e8, 90.0e3, 6.0e3]
+    return [integral, 90.0e3, 6.0e3, 1.0, 0.0, 4.0e3]
+
+
+# the mass histogram of an analysis output or skim file, or the masses of a masses_<inputFile>.npz of eventloop.py
+# returns the Histogram and for npz files the masses and their weights, which are None for ROOT files
+def load_masses(path, name="M"):
+    if path.endswith(".npz"):
+        masses = numpy.load(path)
+        title, xlabel, ylabel, bins, xmin, xmax = mass_histograms[name]
+        histogram = Histogram(name, title + ";" + xlabel + ";" + ylabel, bins, xmin, xmax)
+        histogram.fill(masses[name], masses[name + "_weights"])
+        return histogram, masses[name], masses[name + "_weights"]
+
+    rootfile = ROOT.TFile.Open(path, "READ")
+    # analysis output or skim, for a skim the histogram is rebuilt from the selected events
+    histogram = Histogram.from_th1d(get_histogram(rootfile, name))
+    rootfile.Close()
+    return histogram, None, None
+
+
+# [xmin, xmax] limited to the mass window <name>_window the masses of a masses_<inputFile>.npz were selected in
+# unbinned fits have to be normalized over a range that contains no cut away masses
+def fit_range(path, name="M", xmin=70.0e3, xmax=130.0e3):
+    if path.endswith(".npz"):
+        masses = numpy.load(path)
+        if name + "_window" in masses.files:
+            window = masses[name + "_window"]
+            return max(xmin, float(window[0])), min(xmax, float(window[1]))
+    return xmin, xmax
+
+
+# binned fit of the histogram, or unbinned fit if masses are given
+def make_fit(model, histogram, masses=None, weights=None, xmin=70.0e3, xmax=130.0e3):
+    if masses is None:
+        return BinnedFit.from_histogram(model, histogram, xmin, xmax)
+    return UnbinnedFit(model, masses, weights, xmin, xmax)
+
+
+# the normalization of unbinned fits is not fitted, it is scaled to the histogram for drawing
+def fit(model, start, histogram, masses=None, weights=None, xmin=70.0e3, xmax=130.0e3, fixed=None):
+    fitter = make_fit(model, histogram, masses, weights, xmin, xmax)
+    result = fitter.fit(start, fixed)
+    if masses is not None:
+        result.values = fitter.scaled(result.values, (histogram.xmax - histogram.xmin) / histogram.bins)
+    return result
+
+
+# TGraph of the fitted model for drawing
+def graph(model, par, xmin, xmax, points=1000):
+    x = numpy.linspace(xmin, xmax, points)
+    y = numpy.ascontiguousarray(model(x, par))
+    return ROOT.TGraph(points, x, y)
@@ -1,104 +1,274 @@
 
-import math
+import numbers
+
+import numpy
+
+
+# node of a lazily evaluated numpyarray expression
+# operands are scalars, numpy arrays or other expressions of the same length
+class _Expression(object):
+    def __init__(self, ufunc, operands, size):
+        self.ufunc = ufunc
+        self.operands = operands
+        self.size = size
+
+    def evaluate(self, start, stop):
+        args = []
+        temporaries = []
+        for operand in self.operands:
+            if isinstance(operand, _Expression):
+                args.append(operand.evaluate(start, stop))
+                temporaries.append(True)
+            elif isinstance(operand, numpy.ndarray):
+                args.append(operand[start:stop])
+                temporaries.append(False)
+            else:
+                args.append(operand)
+                temporaries.append(False)
+
+        # write the result into a chunk buffer of a sub expression instead of allocating a new one
+        for arg, temporary in zip(args, temporaries):
+            if temporary and arg.dtype == numpy.float64:
+                return self.ufunc(*args, out=arg)
+
+        return self.ufunc(*args)
+
+    def chunks(self):
+        for start in range(0, self.size, numpyarray.chunk_size):
+            yield self.evaluate(start, min(start + numpyarray.chunk_size, self.size))
+
 
 class numpyarray(object):
+    # with lazy set, operations build an expression that is evaluated chunk by chunk in one pass
+    # when the values are needed. Set numpyarray.lazy = False to compute every operation immediately
+    lazy = True
+    chunk_size = 65536
+
+    # numpy scalars on the left of an operator defer to the reflected methods below
+    __array_ufunc__ = None
+
     def __init__(self, data):
-        self.data = data
-        self.index = 0
+        if isinstance(data, numpyarray):
+            data = data.data
+        # contiguous buffer with spare capacity at the end, only the first _size values are used
+        self._buffer = numpy.array(data)
+        if self._buffer.ndim != 1:
+            self._buffer = self._buffer.reshape(-1)
+        if self._buffer.size == 0:
+            self._buffer = self._buffer.astype(numpy.float64)
+        self._size = len(self._buffer)
+        self._expression = None
+        # set while an unevaluated expression refers to the buffer, writes then copy it first
+        self._shared = False
+
+    @staticmethod
+    def _from_expression(expression):
+        rv = numpyarray([])
+        rv._expression = expression
+        rv._size = expression.size
+        return rv
+
+    def _evaluate(self):
+        if self._expression is None:
+            return
+
+        chunks = self._expression.chunks()
+        first = next(chunks, None)
+        if first is None:
+            first = self._expression.evaluate(0, 0)
+
+        self._buffer = numpy.empty(self._size, dtype=first.dtype)
+        self._buffer[:len(first)] = first
+        start = len(first)
+        for chunk in chunks:
+            self._buffer[start:start + len(chunk)] = chunk
+            start += len(chunk)
+
+        self._expression = None
+
+    def _writable(self):
+        self._evaluate()
+        if self._shared:
+            self._buffer = self._buffer.copy()
+            self._shared = False
+
+    def _node(self):
+        if self._expression is not None:
+            return self._expression
+        self._shared = True
+        return self.data
+
+    @property
+    def data(self):
+        self._evaluate()
+        return self._buffer[:self._size]
 
     def __len__(self):
-        return len(self.data)
+        return self._size
 
-    def __mul__(self, other):
-        if isinstance(other, (float, int)):
-            return numpyarray([x * other for x in self.data])
+    def __array__(self, dtype=None):
+        if dtype is None:
+            return self.data
+        return self.data.astype(dtype)
+
+    def _operand(self, other):
+        if isinstance(other, numbers.Number):
+            return other
 
         if not len(self) == len(other):
             raise ValueError("Incompatible Lengths:" + str(len(self)) + " and " + str(len(other)))
 
-        return numpyarray([x * y for x, y in zip(self.data, other.data)])
+        if isinstance(other, numpyarray):
+            return other
+        return numpy.asarray(other)
+
+    @staticmethod
+    def _apply(ufunc, *operands):
+        size = [len(operand) for operand in operands if isinstance(operand, numpyarray)][0]
+        if numpyarray.lazy:
+            nodes = [operand._node() if isinstance(operand, numpyarray) else operand for operand in operands]
+            return numpyarray._from_expression(_Expression(ufunc, nodes, size))
+
+        return numpyarray(ufunc(*[operand.data if isinstance(operand, numpyarray) else operand for operand in operands]))
+
+    def _inplace(self, ufunc, other):
+        other = self._operand(other)
+        if isinstance(other, numpyarray):
+            other = other.data
+        self._writable()
+        dtype = numpy.result_type(self._buffer, other)
+        if dtype != self._buffer.dtype:
+            self._buffer = self._buffer.astype(dtype)
+        ufunc(self.data, other, out=self.data)
+        return self
+
+    def __mul__(self, other):
+        return numpyarray._apply(numpy.multiply, self, self._operand(other))
 
     def __rmul__(self, other):
         return self * other
 
+    def __imul__(self, other):
+        return self._inplace(numpy.multiply, other)
+
     def __add__(self, other):
-        if isinstance(other, (float, int)):
-            return numpyarray([x + other for x in self.data])
+        return numpyarray._apply(numpy.add, self, self._operand(other))
 
-        if not len(self) == len(other):
-            raise ValueError("Incompatible Lengths:" + str(len(self)) + " and " + str(len(other)))
+    def __radd__(self, other):
+        return self + other
 
-        return numpyarray([x + y for x, y in zip(self.data, other.data)])
+    def __iadd__(self, other):
+        return self._inplace(numpy.add, other)
 
     def __sub__(self, other):
-        if isinstance(other, (float, int)):
-            return numpyarray([x - other for x in self.data])
-
-        if not len(self) == len(other):
-            raise ValueError("Incompatible Lengths:" + str(len(self)) + " and " + str(len(other)))
+        return numpyarray._apply(numpy.subtract, self, self._operand(other))
 
-        return numpyarray([x - y for x, y in zip(self.data, other.data)])
+    def __rsub__(self, other):
+        return numpyarray._apply(numpy.subtract, self._operand(other), self)
 
+    def __isub__(self, other):
+        return self._inplace(numpy.subtract, other)
 
     def __div__(self, other):
-        if isinstance(other, (float, int)):
-            return numpyarray([x / other for x in self.data])
+        return numpyarray._apply(numpy.true_divide, self, self._operand(other))
 
-        if not len(self) == len(other):
-            raise ValueError("Incompatible Lengths:" + str(len(self)) + " and " + str(len(other)))
+    def __rdiv__(self, other):
+        return numpyarray._apply(numpy.true_divide, self._operand(other), self)
+
+    def __idiv__(self, other):
+        self._evaluate()
+        if self._buffer.dtype.kind in "biu":
+            self._buffer = self._buffer.astype(numpy.float64)
+            self._shared = False
+        return self._inplace(numpy.true_divide, other)
 
-        return numpyarray([x / y for x, y in zip(self.data, other.data)])
+    __truediv__ = __div__
+    __rtruediv__ = __rdiv__
+    __itruediv__ = __idiv__
 
     def __getitem__(self, key):
-        return self.data[key]
+        if isinstance(key, numbers.Integral):
+            if self._expression is not None:
+                if key < 0:
+                    key += self._size
+                if not 0 <= key < self._size:
+                    raise IndexError("index out of range")
+                return self._expression.evaluate(key, key + 1)[0]
+            return self.data[key]
+
+        if isinstance(key, numpyarray):
+            key = key.data
+
+        if self._expression is not None and isinstance(key, numpy.ndarray) and key.dtype == bool:
+            # apply a boolean mask chunk by chunk without evaluating the whole expression
+            size = numpyarray.chunk_size
+            chunks = [chunk[key[i * size:(i + 1) * size]] for i, chunk in enumerate(self._expression.chunks())]
+            return numpyarray(numpy.concatenate(chunks) if chunks else [])
+
+        return numpyarray(self.data[key])
 
     def __setitem__(self, key, value):
+        self._writable()
         self.data[key] = value
 
     def append(self, item):
-        self.data.append(item)
+        self._evaluate()
+        if self._size == len(self._buffer):
+            # grow geometrically, so appending is amortized constant time
+            grown = numpy.empty(max(16, 2 * len(self._buffer)), dtype=self._buffer.dtype)
+            grown[:self._size] = self.data
+            self._buffer = grown
+            self._shared = False
+
+        if self._buffer.dtype != object and isinstance(item, (numbers.Number, numpy.generic)):
+            # promote the buffer like _inplace does, so e.g. 2.5 is not truncated in an int buffer
+            dtype = numpy.result_type(self._buffer, item)
+            if dtype != self._buffer.dtype:
+                self._buffer = self._buffer.astype(dtype)
+                self._shared = False
+
+        try:
+            self._buffer[self._size] = item
+        except (TypeError, ValueError):
+            # non numeric items (e.g. TLorentzVector) are kept as objects
+            self._buffer = self._buffer.astype(object)
+            self._shared = False
+            self._buffer[self._size] = item
+
+        self._size += 1
 
     def mean(self):
-        return sum(self.data) / len(self.data)
+        if self._expression is not None:
+            return sum(chunk.sum() for chunk in self._expression.chunks()) / len(self)
+        return self.data.sum() / len(self)
 
     def __iter__(self):
-        return self
-
-    def next(self):
-        if self.index >= len(self.data):
-            raise StopIteration
-        rv = self.data[self.index]
-        self.index += 1
-        return rv
+        if self._expression is not None:
+            return (value for chunk in self._expression.chunks() for value in chunk)
+        return iter(self.data)
 
     @staticmethod
     def cosh(arr):
-        return numpyarray([math.cosh(x) for x in arr.data])
+        return numpyarray._apply(numpy.cosh, arr)
 
     @staticmethod
     def sqrt(arr):
-        return numpyarray([math.sqrt(x) for x in arr.data])
+        return numpyarray._apply(numpy.sqrt, arr)
 
     @staticmethod
     def cos(arr):
-        return numpyarray([math.cos(x) for x in arr.data])
+        return numpyarray._apply(numpy.cos, arr)
 
     @staticmethod
     def vectorize(f):
         def inner(*arrs, **kwargs):
-            rv = numpyarray([])
             for i in range(len(arrs) - 1):
                 if not len(arrs[i]) == len(arrs[i + 1]):
                     raise ValueError("Incompatible Lengths")
             # all arrays are of same length
-            rv = numpyarray([f(*[arr[i] for arr in arrs], **kwargs) for i in range(len(arrs[0]))])
-            # for i in range(len(arrs[0])
-            #     elements = [arr[i] for arr in arrs]
-            #     f_val = f(*elements, **kwargs)
-            #     rv.append(f_val)
-            # rv = numpyarray([f(x, *args, **kwargs) for x in arr])
-            return rv
+            datas = [numpy.asarray(arr) for arr in arrs]
+            return numpyarray([f(*[data[i] for data in datas], **kwargs) for i in range(len(arrs[0]))])
         return inner
 
     def __repr__(self):
-        return str(self.data)
+        return str(self.data.tolist())
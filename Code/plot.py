@@ -5,6 +5,10 @@ import os, sys
 
 import argparse
 
+from skim import get_histogram, read_sum_of_weights
+from plotwrapper import Histogram
+from templatefit import TemplateFit, scaled_template
+
 
 
 def styleHisto(histo, color, xtit, ytit, filled=False):
@@ -57,6 +61,8 @@ parser.add_argument('-d', metavar='path_data', type=str, nargs=1, help='Input Da
 parser.add_argument('-e', metavar='path_ee', type=str, nargs=1, help='Input MC Zee file', required=False)
 parser.add_argument('-m', metavar='path_mm', type=str, nargs=1, help='Input MC Zmumu file', required=False)
 parser.add_argument('-t', metavar='path_tt', type=str, nargs=1, help='Input MC Ztautau file', required=False)
+parser.add_argument('-fit', action='store_true', help='Fit the normalizations of the MC samples to the data before stacking')
+parser.add_argument('-scale', metavar='energy_scale', type=float, nargs=1, help='Relative lepton energy scale uncertainty, fitted as a shape nuisance of all MC samples (e.g. 0.01)', required=False)
 
 args = parser.parse_args()
 
@@ -78,7 +84,9 @@ else:
 
 #Scaling is done by calculating the luminosity scale factor of the sample via xsec/sumw and multiplying the target luminosity
 #target luminosity = 1000 pb^-1 for all samples
-#The sumw variable assumes you have processed all events in the sample.
+#sumw is read from the files written by eventloop.py, it is the sum of weights of all entries the event loop read.
+#The hard-coded sumw values are used for older outputs without it and assume you have processed all events in the sample.
+#python prescan.py -f <MC file> computes the sumw of a new sample from its weight branch alone.
 
 xsec_e = 8175.7172
 sumw_e = 203795455568148
@@ -88,6 +96,14 @@ xsec_t = 1346.6041
 sumw_t = 31508540303680.9
 lumi   = 1000
 
+def sample_sumw(rootfile, default):
+    sum_of_weights = read_sum_of_weights(rootfile)
+    if sum_of_weights is None:
+        print "No sum of weights in", rootfile.GetName(), "using the full sample value", default
+        return default
+    print "Sum of weights of", rootfile.GetName(), ":", sum_of_weights[1], "from", int(sum_of_weights[0]), "entries"
+    return sum_of_weights[1]
+
 #open the input files
 print path_d
 print path_e
@@ -114,10 +130,13 @@ stack = ROOT.THStack("Invariant Mass", "Invariant Mass of the Z candidate")
 
 fillcolor = 2 # red -> green -> blue -> yellow -> ...
 
+# scaled MC histograms with their name and cross section, for the template fit
+templates = []
+
 
 if os.path.isfile(path_d) and os.access(path_d, os.R_OK):
     file_d = ROOT.TFile(path_d, "READ")
-    h_d = file_d.Get(histname)
+    h_d = get_histogram(file_d, histname)
     h_d.SetFillColor(fillcolor)
     fillcolor += 1
     stack.Add(h_d)
@@ -127,8 +146,10 @@ else:
 if path_e:
     if os.path.isfile(path_e) and os.access(path_e, os.R_OK):
         file_e = ROOT.TFile(path_e, "READ")
-        h_e = file_e.Get(histname)
+        h_e = get_histogram(file_e, histname)
+        sumw_e = sample_sumw(file_e, sumw_e)
         h_e.Scale(lumi * xsec_e / sumw_e)
+        templates.append(("Zee", h_e, xsec_e))
         h_e.SetFillColor(fillcolor)
         fillcolor += 1
         stack.Add(h_e)
@@ -138,8 +159,10 @@ if path_e:
 if path_m:
     if os.path.isfile(path_m) and os.access(path_m, os.R_OK):
         file_m = ROOT.TFile(path_m, "READ")
-        h_m = file_m.Get(histname)
+        h_m = get_histogram(file_m, histname)
+        sumw_m = sample_sumw(file_m, sumw_m)
         h_m.Scale(lumi * xsec_m / sumw_m)
+        templates.append(("Zmumu", h_m, xsec_m))
         h_m.SetFillColor(fillcolor)
         fillcolor += 1
         stack.Add(h_m)
@@ -149,14 +172,38 @@ if path_m:
 if path_t:
     if os.path.isfile(path_t) and os.access(path_t, os.R_OK):
         file_t = ROOT.TFile(path_t, "READ")
-        h_t = file_t.Get(histname)
+        h_t = get_histogram(file_t, histname)
+        sumw_t = sample_sumw(file_t, sumw_t)
         h_t.Scale(lumi * xsec_t / sumw_t)
+        templates.append(("Ztautau", h_t, xsec_t))
         h_t.SetFillColor(fillcolor)
         fillcolor += 1
         stack.Add(h_t)
     else:
         sys.exit("Error: File " + path_t + " does not exist or is not readable")
 
+# fit a normalization mu per MC sample to the data, the MC histograms are drawn scaled by the fitted mu
+# the ratio of the mu times the cross sections is the measured ratio of the cross sections
+if args.fit:
+    if len(templates) == 0:
+        sys.exit("Error: The template fit needs at least one MC file")
+    data = Histogram.from_th1d(h_d)
+    mc = [Histogram.from_th1d(h) for name, h, xsec in templates]
+    names = [name for name, h, xsec in templates]
+    template_fit = TemplateFit.from_histograms(data, mc, names, 70e3, 130e3)
+    if args.scale != None:
+        template_fit.add_shape("scale", dict((name, scaled_template(histogram, 1 + args.scale[0])) for name, histogram in zip(names, mc)),
+                               dict((name, scaled_template(histogram, 1 - args.scale[0])) for name, histogram in zip(names, mc)))
+    result = template_fit.fit()
+    print result.table()
+    for i, (name, h, xsec) in enumerate(templates):
+        for other, h_other, xsec_other in templates[i + 1:]:
+            print "sigma(%s) / sigma(%s) = %.4f +- %.4f" % ((name, other) + result.ratio(name, other, xsec, xsec_other))
+    if result.status != 0:
+        print "Warning: the template fit did not converge"
+    for name, h, xsec in templates:
+        h.Scale(result.mu(name))
+
 styleHisto(h_d, ROOT.kBlack, "M_{ll} [GeV]", "Entries")
 legend.AddEntry(h_d, "Data", "lep")
 
@@ -1,8 +1,14 @@
 
 # random canvas ID:
 import random
+import multiprocessing
 
 import ROOT
+import numpy
+
+from entrylist import EntryList
+from numpyarray import numpyarray
+import columnar
 
 def isclose(a, b, rel_tol=1e-09, abs_tol=0.0):
     return abs(a-b) <= max(rel_tol * max(abs(a), abs(b)), abs_tol)
@@ -79,6 +85,241 @@ class Entry(object):
         self.lep_flag = chain.lep_flag
             
 
+# per-event lists of values (e.g. lep_pt) stored as one flat value buffer plus event offsets
+# the values of event i are content[offsets[i]:offsets[i + 1]]
+class JaggedArray(object):
+    def __init__(self, content=None, offsets=None):
+        if content is None:
+            content = numpy.zeros(16)
+            offsets = numpy.zeros(16, dtype=numpy.int64)
+            self._size = 0
+        else:
+            content = numpy.asarray(content, dtype=numpy.float64)
+            offsets = numpy.asarray(offsets, dtype=numpy.int64)
+            self._size = len(offsets) - 1
+        self._content = content
+        self._offsets = offsets
+
+    @staticmethod
+    def from_lists(lists):
+        rv = JaggedArray()
+        for values in lists:
+            rv.append(values)
+        return rv
+
+    @property
+    def content(self):
+        return self._content[:self._offsets[self._size]]
+
+    @property
+    def offsets(self):
+        return self._offsets[:self._size + 1]
+
+    def counts(self):
+        return numpy.diff(self.offsets)
+
+    def append(self, values):
+        values = numpy.fromiter(values, dtype=numpy.float64)
+        start = self._offsets[self._size]
+        stop = start + len(values)
+
+        # grow geometrically, so appending is amortized constant time
+        if stop > len(self._content):
+            grown = numpy.empty(max(2 * len(self._content), stop), dtype=numpy.float64)
+            grown[:start] = self._content[:start]
+            self._content = grown
+        if self._size + 2 > len(self._offsets):
+            grown = numpy.empty(2 * len(self._offsets), dtype=numpy.int64)
+            grown[:self._size + 1] = self.offsets
+            self._offsets = grown
+
+        self._content[start:stop] = values
+        self._size += 1
+        self._offsets[self._size] = stop
+
+    def extend(self, other):
+        start = self._offsets[self._size]
+        self._content = numpy.concatenate([self.content, other.content])
+        self._offsets = numpy.concatenate([self.offsets, other.offsets[1:] - other.offsets[0] + start])
+        self._size += len(other)
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, key):
+        if key < 0:
+            key += self._size
+        if not 0 <= key < self._size:
+            raise IndexError("index out of range")
+        return self._content[self._offsets[key]:self._offsets[key + 1]]
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+    # k-th value of every event, events without a k-th value get default or raise an IndexError
+    def leading(self, k, default=None):
+        offsets = self.offsets
+        has_value = offsets[1:] - offsets[:-1] > k
+        if default is None:
+            if not has_value.all():
+                raise IndexError("Not all events have " + str(k + 1) + " values")
+            return numpyarray(self._content[offsets[:-1] + k])
+
+        rv = numpy.full(self._size, default, dtype=numpy.float64)
+        rv[has_value] = self._content[offsets[:-1][has_value] + k]
+        return numpyarray(rv)
+
+    # position of every value within its event
+    def slots(self):
+        counts = self.counts()
+        return numpy.arange(len(self.content)) - numpy.repeat(self.offsets[:-1], counts)
+
+    # fills the i-th value of every event into the Histogram hists[i], weights are per event
+    def fill(self, hists, weights=None, first=0):
+        counts = self.counts()[first:]
+        start = self.offsets[first]
+        values = self.content[start:]
+        slots = self.slots()[start:]
+        if weights is None:
+            weights = numpy.ones(len(counts))
+        weights = numpy.repeat(numpy.asarray(weights, dtype=numpy.float64)[first:], counts)
+
+        for i, hist in enumerate(hists):
+            in_slot = slots == i
+            hist.fill(values[in_slot], weights[in_slot])
+
+
+# fixed bin width histogram on numpy arrays, bin 0 and bin bins + 1 are the under- and overflow as in ROOT
+# keeps the sum of weights and the sum of squared weights of every bin like TH1::Sumw2
+class Histogram(object):
+    def __init__(self, name, title, bins, xmin, xmax):
+        self.name = name
+        self.title = title
+        self.bins = bins
+        self.xmin = xmin
+        self.xmax = xmax
+        self.reset()
+
+    def reset(self):
+        self.sumw = numpy.zeros(self.bins + 2)
+        self.sumw2 = numpy.zeros(self.bins + 2)
+        self.entries = 0
+        # sum of w, w^2, w*x and w*x^2 of the values in range, as TH1::GetStats returns them
+        self.stats = numpy.zeros(4)
+
+    def copy(self, name=None):
+        rv = Histogram(self.name if name is None else name, self.title, self.bins, self.xmin, self.xmax)
+        rv.sumw = self.sumw.copy()
+        rv.sumw2 = self.sumw2.copy()
+        rv.entries = self.entries
+        rv.stats = self.stats.copy()
+        return rv
+
+    # same bin numbers as TAxis::FindFixBin
+    def find_bins(self, values):
+        values = numpy.asarray(values, dtype=numpy.float64)
+        with numpy.errstate(invalid="ignore"):
+            bins = numpy.floor(self.bins * (values - self.xmin) / (self.xmax - self.xmin)).astype(numpy.int64) + 1
+            bins[values < self.xmin] = 0
+            bins[values >= self.xmax] = self.bins + 1
+        return bins
+
+    def centers(self):
+        width = (self.xmax - self.xmin) / float(self.bins)
+        return self.xmin + width * (numpy.arange(self.bins + 2) - 0.5)
+
+    def errors(self):
+        return numpy.sqrt(self.sumw2)
+
+    # fills all values at once, NaN values are skipped
+    def fill(self, values, weights=None):
+        values = numpy.asarray(values, dtype=numpy.float64).reshape(-1)
+        if weights is None:
+            weights = numpy.ones(len(values))
+        else:
+            weights = numpy.broadcast_to(numpy.asarray(weights, dtype=numpy.float64), values.shape)
+
+        valid = ~numpy.isnan(values)
+        if not valid.all():
+            values = values[valid]
+            weights = weights[valid]
+
+        bins = self.find_bins(values)
+        self.sumw += numpy.bincount(bins, weights=weights, minlength=self.bins + 2)
+        self.sumw2 += numpy.bincount(bins, weights=weights * weights, minlength=self.bins + 2)
+        self.entries += len(values)
+
+        in_range = (bins > 0) & (bins <= self.bins)
+        x = values[in_range]
+        w = weights[in_range]
+        self.stats += [w.sum(), (w * w).sum(), (w * x).sum(), (w * x * x).sum()]
+
+    def _check_compatible(self, other):
+        if (self.bins, self.xmin, self.xmax) != (other.bins, other.xmin, other.xmax):
+            raise ValueError("Incompatible binning of " + self.name + " and " + other.name)
+
+    # like TH1::Add, adds scale times the other histogram
+    def add(self, other, scale=1.0):
+        self._check_compatible(other)
+        self.sumw += scale * other.sumw
+        self.sumw2 += scale * scale * other.sumw2
+        self.entries += other.entries
+        self.stats += numpy.array([scale, scale * scale, scale, scale]) * other.stats
+        return self
+
+    def merge(self, other):
+        return self.add(other)
+
+    # like TH1::Divide, bins with an empty denominator are set to 0
+    def divide(self, other):
+        self._check_compatible(other)
+        nonzero = other.sumw != 0
+        sumw = numpy.zeros(self.bins + 2)
+        sumw2 = numpy.zeros(self.bins + 2)
+
+        a, b = self.sumw[nonzero], other.sumw[nonzero]
+        sumw[nonzero] = a / b
+        sumw2[nonzero] = (self.sumw2[nonzero] * b * b + other.sumw2[nonzero] * a * a) / b ** 4
+
+        self.sumw = sumw
+        self.sumw2 = sumw2
+        self.reset_stats()
+        return self
+
+    # computes the statistics from the bin contents like TH1::ResetStats
+    def reset_stats(self):
+        x = self.centers()[1:-1]
+        c = self.sumw[1:-1]
+        self.stats = numpy.array([c.sum(), self.sumw2[1:-1].sum(), (c * x).sum(), (c * x * x).sum()])
+
+    # writes the histogram into the given TH1D or a new one, e.g. for drawing or outfile.Write()
+    def to_th1d(self, hist=None):
+        if hist is None:
+            hist = ROOT.TH1D(self.name, self.title, self.bins, self.xmin, self.xmax)
+        hist.Reset()
+        if hist.GetSumw2N() == 0:
+            hist.Sumw2()
+        hist.SetContent(self.sumw)
+        hist.SetError(self.errors())
+        hist.SetEntries(self.entries)
+        hist.PutStats(self.stats.copy())
+        return hist
+
+    @staticmethod
+    def from_th1d(hist):
+        axis = hist.GetXaxis()
+        rv = Histogram(hist.GetName(), hist.GetTitle(), hist.GetNbinsX(), axis.GetXmin(), axis.GetXmax())
+        for i in range(rv.bins + 2):
+            rv.sumw[i] = hist.GetBinContent(i)
+            rv.sumw2[i] = hist.GetBinError(i) ** 2
+        rv.entries = int(hist.GetEntries())
+        stats = numpy.zeros(4)
+        hist.GetStats(stats)
+        rv.stats = stats
+        return rv
+
+
 class Plot(object):
     def __init__(self, chain, name, is_list, title, xlabel, ylabel, bins, xmin, xmax):
         self.chain = chain
@@ -91,63 +332,97 @@ class Plot(object):
         self.xmin = xmin
         self.xmax = xmax
         self.data = []
+        self.weights = numpyarray([])
         self.total_entries = 0
 
+        # values are filled into the numpy histograms in batches, hist holds the TH1D copies for drawing and writing
+        self._filled = 0
         if self.is_list:
+            self.data = JaggedArray()
+            self.histogram = []
             self.hist = []
         else:
-            self.hist = ROOT.TH1D(self.name, self.title + ";" + self.xlabel + ";" + self.ylabel, self.bins, self.xmin, self.xmax)
+            self.histogram = self._new_histogram(self.name)
+            self.hist = ROOT.TH1D(self.name, self.histogram.title, self.bins, self.xmin, self.xmax)
 
     def acquire_entries(self, num_entries=-1, selector=None, weight=None):
-        if num_entries < 0:
-            num_entries = self.chain.GetEntriesFast()
+        EventLoop(self.chain, [self], selector=selector, weight=weight).run(num_entries)
 
-        self.total_entries = num_entries
-        for jentry in range(0, num_entries):
-            if jentry % 100000 == 0:
-                print 100 * jentry / num_entries, r"% complete."
+    def fill(self, data_item, weight=1):
+        # the histograms are filled in one go by finish
+        self.data.append(data_item)
+        self.weights.append(weight)
 
-            nb = self.chain.GetEntry(jentry)
-            # print "nb:", nb
-            if nb <= 0:
-                continue
+    def finish(self):
+        if self._filled == len(self.data):
+            return
 
-            if weight is None:
-                _weight = 1
-            else:
-                _weight = self.chain.__getattr__(weight)
+        if self.is_list:
+            counts = self.data.counts()
+            for i in range(len(self.hist), counts.max() if len(counts) else 0):
+                self.histogram.append(self._new_histogram(self.name + str(i)))
+                self.hist.append(self._new_slot_histogram(i))
 
-            data_item = self.chain.__getattr__(self.name)
-            if selector is not None:
-                data_item = selector(data_item, self.chain)
-                if data_item is None:
-                    continue
+            self.data.fill(self.histogram, self.weights.data, first=self._filled)
+            for histogram, hist in zip(self.histogram, self.hist):
+                histogram.to_th1d(hist)
+        else:
+            self.histogram.fill(self.data[self._filled:], self.weights.data[self._filled:])
+            self.histogram.to_th1d(self.hist)
 
-            if not self.is_list:
-                self.data.append(data_item)
-                self.hist.Fill(data_item, _weight)
-            else:
-                self.data.append(list(data_item))
-                for i, item in enumerate(data_item):
-                    if i == len(self.hist):
-                        self.hist.append(ROOT.TH1D(self.name + str(i), self.title + ";" + self.xlabel + ";" + self.ylabel, self.bins, self.xmin, self.xmax))
-                    self.hist[i].Fill(item, _weight)
+        self._filled = len(self.data)
+
+    def _new_histogram(self, name):
+        return Histogram(name, self.title + ";" + self.xlabel + ";" + self.ylabel, self.bins, self.xmin, self.xmax)
+
+    def _new_slot_histogram(self, i):
+        return ROOT.TH1D(self.name + str(i), self.title + ";" + self.xlabel + ";" + self.ylabel, self.bins, self.xmin, self.xmax)
+
+    def reset(self):
+        self.weights = numpyarray([])
+        self._filled = 0
+        if self.is_list:
+            self.data = JaggedArray()
+            self.histogram = []
+            self.hist = []
+        else:
+            self.data = []
+            self.histogram.reset()
+            self.hist.Reset()
+
+    # values and weights of the plot, used to merge the results of parallel event loops
+    def state(self):
+        if self.is_list:
+            return self.data.content, self.data.offsets, self.weights.data
+        return self.data, self.weights.data
+
+    # the histograms are filled from the merged values in entry order, so they come out as in a serial run
+    def merge(self, state):
+        if self.is_list:
+            content, offsets, weights = state
+            self.data.extend(JaggedArray(content, offsets))
+        else:
+            data, weights = state
+            self.data.extend(data)
+        self.weights = numpyarray(numpy.concatenate([self.weights.data, weights]))
 
     def acquire_from_data(self, data):
         self.data = data
-        weight = 1
-        for item in data:
-            self.hist.Fill(item, weight)
-
+        values = numpy.asarray(data, dtype=numpy.float64)
+        self.weights = numpyarray(numpy.ones(len(values)))
+        self._filled = len(values)
+        self.histogram.fill(values)
+        self.histogram.to_th1d(self.hist)
 
     def acquire_from_dict(self, dict):
-        weight = 1
-        self.data = []
-        for key, value in dict.items():
-            for _ in range(value):
-                self.data.append(key)
-                self.hist.Fill(key, weight)
+        keys = numpy.array(dict.keys(), dtype=numpy.float64)
+        counts = numpy.array(dict.values(), dtype=numpy.int64)
+        self.acquire_from_data(list(numpy.repeat(keys, counts)))
 
+    # replaces the histogram of the plot, e.g. with a Histogram computed from others
+    def set_histogram(self, histogram):
+        self.histogram = histogram
+        self.histogram.to_th1d(self.hist)
 
     def draw(self, which=None):
         canvas = ROOT.TCanvas("".join([chr(random.randint(ord('a'), ord('z'))) for _ in range(512)]), 'Analysis Plots', 200, 10, 700, 500)
@@ -183,3 +458,298 @@ class Plot(object):
         else:
             self.hist = [self.hist, histogram]
 
+
+# reads every entry of the chain once, runs the selector once and fills all registered plots
+# consumers (e.g. TagAndProbe) get every entry that is read with its weight, independent of the selector,
+# through consumer.process(chain, weight). They list their branches and have finish, reset, state and merge like plots
+# sumw_entries, sumw and sumw2 count all entries read by run, selected or not, for the normalization of MC samples
+class EventLoop(object):
+    def __init__(self, chain, plots=None, selector=None, weight=None, branches=None, consumers=None):
+        self.chain = chain
+        self.selector = selector
+        self.weight = weight
+        # additional branches to read, the ones of the plots, selector, consumers and weight are always read
+        self.override_branches = branches
+        self.plots = []
+        self.consumers = []
+        self.total_entries = 0
+        self.selected_entries = 0
+        self.sumw_entries = 0
+        self.sumw = 0.0
+        self.sumw2 = 0.0
+        self.count_weights = True
+        self.entry_list = None
+        self.entry_list_path = None
+        self.entry_list_key = None
+        self.cutflow_path = None
+        self.cache_entries = None
+
+        if plots is not None:
+            for plot in plots:
+                self.register(plot)
+        if consumers is not None:
+            for consumer in consumers:
+                self.add_consumer(consumer)
+
+    def register(self, plot):
+        self.plots.append(plot)
+        return plot
+
+    def add_consumer(self, consumer):
+        self.consumers.append(consumer)
+        return consumer
+
+    # branches needed by the registered plots, the selector, the consumers and the weight, plus the explicit ones
+    # None means all branches, which is the case for selectors that do not list their branches
+    def branches(self):
+        if self.selector is not None and not hasattr(self.selector, "branches"):
+            return None
+
+        # explicit branches are read in addition, the ones the loop needs are never left out
+        rv = list(self.override_branches) if self.override_branches is not None else []
+        rv += [plot.name for plot in self.plots]
+        if self.selector is not None:
+            rv += self.selector.branches()
+        for consumer in self.consumers:
+            rv += consumer.branches()
+        if self.weight is not None:
+            rv.append(self.weight)
+
+        # variable length arrays like lep_pt[lep_n] also need their counter branch
+        for name in list(rv):
+            branch = self.chain.GetBranch(name)
+            if not branch:
+                raise ValueError("No branch " + name + " in tree " + self.chain.GetName())
+            leaf_count = branch.GetListOfLeaves().At(0).GetLeafCount()
+            if leaf_count:
+                rv.append(leaf_count.GetName())
+
+        return sorted(set(rv))
+
+    def enable_branches(self):
+        branches = self.branches()
+        if branches is None:
+            return
+
+        self.chain.SetBranchStatus("*", 0)
+        for name in branches:
+            self.chain.SetBranchStatus(name, 1)
+
+    def enable_all_branches(self):
+        self.chain.SetBranchStatus("*", 1)
+
+    # store the selection result of the first num_entries entries next to the input file, or in cache_dir,
+    # and reuse it on later runs over the same entries
+    def cache_selection(self, file_name, definition, num_entries=-1, cache_dir=None):
+        if num_entries < 0:
+            num_entries = self.chain.GetEntriesFast()
+
+        self.cache_entries = num_entries
+        self.entry_list_key = EntryList.key(file_name, definition, num_entries)
+        self.entry_list_path = EntryList.sidecar_path(file_name, self.entry_list_key, directory=cache_dir)
+        self.cutflow_path = EntryList.sidecar_path(file_name, self.entry_list_key, ".cutflow", cache_dir)
+        self.entry_list = EntryList.load(self.entry_list_path, self.entry_list_key)
+        if self.entry_list is not None:
+            print "Using cached selection", self.entry_list_path
+
+    # evaluates the selector column-wise on whole branches, the event loop then only visits passing entries
+    def select_columnar(self, num_entries=-1, chunk_size=500000):
+        if num_entries < 0:
+            num_entries = self.chain.GetEntriesFast()
+
+        if self.entry_list is not None and self.entry_list.num_entries == num_entries:
+            return self.entry_list
+
+        self.entry_list = columnar.select(self.chain, self.selector, num_entries, chunk_size)
+        self._save_selection(self.entry_list)
+
+        return self.entry_list
+
+    # a cache that cannot be written (e.g. next to a read-only input file) only costs the speed up of the next run
+    def _save_selection(self, entry_list):
+        if self.entry_list_path is None or entry_list.num_entries != self.cache_entries:
+            return
+
+        try:
+            entry_list.save(self.entry_list_path, self.entry_list_key)
+            self._save_cutflow()
+        except (IOError, OSError) as e:
+            print "Warning: could not write the cached selection", self.entry_list_path, ":", e
+
+    # the cut flow of a cached selection is stored next to the entry list
+    def _save_cutflow(self):
+        if hasattr(self.selector, "cutflow"):
+            self.selector.cutflow.save(self.cutflow_path)
+
+    def _load_cutflow(self):
+        # a selection made by select_columnar without a cache has counted the cut flow already
+        if self.cutflow_path is None or not hasattr(self.selector, "cutflow"):
+            return
+
+        cutflow = self.selector.cutflow.load(self.cutflow_path, self.selector.cutflow.names, self.selector.cutflow.weight)
+        if cutflow is None:
+            print "No cached cut flow for", self.selector.cutflow.weight, "weights, the cut flow stays empty"
+        else:
+            self.selector.cutflow = cutflow
+
+    def run(self, num_entries=-1, processes=1):
+        if num_entries < 0:
+            num_entries = self.chain.GetEntriesFast()
+
+        self.total_entries = num_entries
+        for plot in self.plots:
+            plot.total_entries = num_entries
+
+        self.sumw_entries = 0
+        self.sumw = 0.0
+        self.sumw2 = 0.0
+        self.count_weights = True
+
+        selector = self.selector
+        record = None
+        accepted = None
+        if self.entry_list is not None and self.entry_list.num_entries == num_entries:
+            selector = None
+            self._load_cutflow()
+            if self.consumers:
+                # consumers see every entry, the cached selection only decides which entries fill the plots
+                entries = range(0, num_entries)
+                accepted = self.entry_list
+            else:
+                # rejected entries are skipped without reading them, only their weights are read column-wise
+                entries = list(self.entry_list.entries())
+                self.sumw_entries, self.sumw, self.sumw2 = columnar.sum_weights(self.chain, self.weight, num_entries)
+                self.count_weights = False
+        else:
+            entries = range(0, num_entries)
+            record = EntryList(num_entries)
+
+        if processes > 1:
+            self._run_parallel(entries, selector, record, accepted, processes)
+        else:
+            # only the branches in use are read and decompressed by GetEntry
+            self.enable_branches()
+            self._process(entries, selector, record, accepted)
+            self.enable_all_branches()
+
+        for plot in self.plots:
+            plot.finish()
+        for consumer in self.consumers:
+            consumer.finish()
+
+        if record is not None:
+            self._save_selection(record)
+            self.entry_list = record
+
+        return self
+
+    def _process(self, entries, selector, record, accepted=None):
+        for i, jentry in enumerate(entries):
+            if i % 100000 == 0:
+                print 100 * i / len(entries), r"% complete."
+
+            nb = self.chain.GetEntry(jentry)
+            if nb <= 0:
+                continue
+
+            if self.weight is None:
+                _weight = 1
+            else:
+                _weight = self.chain.__getattr__(self.weight)
+
+            if self.count_weights:
+                self.sumw_entries += 1
+                self.sumw += _weight
+                self.sumw2 += _weight * _weight
+
+            for consumer in self.consumers:
+                consumer.process(self.chain, _weight)
+
+            if accepted is not None and not accepted.contains(jentry):
+                continue
+
+            if selector is not None and selector(True, self.chain) is None:
+                continue
+
+            if record is not None:
+                record.enter(jentry)
+
+            self.selected_entries += 1
+            for plot in self.plots:
+                plot.fill(self.chain.__getattr__(plot.name), _weight)
+
+    # splits the entries into ranges that are processed by forked worker processes, each with its own TFile
+    # the results are merged in entry order, so data and histograms come out as in a serial run
+    # selectors with side effects (e.g. filling global dicts) only see the entries of their own process
+    def _run_parallel(self, entries, selector, record, accepted, processes):
+        global _parallel_loop
+        _parallel_loop = (self, entries, selector, record, accepted, self.chain.GetCurrentFile().GetName(), self.chain.GetName())
+
+        chunk = max(1, (len(entries) + 4 * processes - 1) // (4 * processes))
+        ranges = [(first, min(first + chunk, len(entries))) for first in range(0, len(entries), chunk)]
+
+        pool = multiprocessing.Pool(processes, _open_parallel_file)
+        try:
+            for states, consumer_states, selected_entries, sums, bits, cutflow in pool.imap(_run_parallel_range, ranges):
+                for plot, state in zip(self.plots, states):
+                    plot.merge(state)
+                for consumer, state in zip(self.consumers, consumer_states):
+                    consumer.merge(state)
+                self.selected_entries += selected_entries
+                if self.count_weights:
+                    self.sumw_entries += sums[0]
+                    self.sumw += sums[1]
+                    self.sumw2 += sums[2]
+                if cutflow is not None:
+                    selector.cutflow.merge(cutflow)
+                if record is not None:
+                    record.merge(EntryList(record.num_entries, bits))
+        finally:
+            pool.close()
+            pool.join()
+            _parallel_loop = None
+
+
+# the event loop run in parallel, set before the worker processes are forked
+_parallel_loop = None
+
+# the input file of a worker process, open for the lifetime of the worker so its tree stays valid for all ranges
+_parallel_file = None
+
+
+def _open_parallel_file():
+    global _parallel_file
+    loop, entries, selector, record, accepted, file_name, tree_name = _parallel_loop
+    _parallel_file = ROOT.TFile(file_name)
+    loop.chain = _parallel_file.Get(tree_name)
+    loop.enable_branches()
+
+
+def _run_parallel_range(entry_range):
+    loop, entries, selector, record, accepted, file_name, tree_name = _parallel_loop
+    first, last = entry_range
+
+    loop.selected_entries = 0
+    loop.sumw_entries = 0
+    loop.sumw = 0.0
+    loop.sumw2 = 0.0
+    for plot in loop.plots:
+        plot.reset()
+    for consumer in loop.consumers:
+        consumer.reset()
+    if record is not None:
+        record = EntryList(record.num_entries)
+    cutflow = None
+    if hasattr(selector, "cutflow"):
+        selector.reset_cutflow()
+
+    loop._process(entries[first:last], selector, record, accepted)
+
+    states = [plot.state() for plot in loop.plots]
+    consumer_states = [consumer.state() for consumer in loop.consumers]
+
+    if hasattr(selector, "cutflow"):
+        cutflow = selector.cutflow
+
+    sums = (loop.sumw_entries, loop.sumw, loop.sumw2)
+    return states, consumer_states, loop.selected_entries, sums, record.bits if record is not None else None, cutflow
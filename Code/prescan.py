@@ -0,0 +1,98 @@
+import os
+import os.path
+import sys
+import json
+import hashlib
+import argparse
+
+import ROOT
+
+import columnar
+from entrylist import EntryList
+
+
+# number of entries, sum of weights and sum of squared weights of a sample, for the normalization of MC samples
+# only the weight branch is read, in large chunks with TTree::Draw, the result is cached next to the input file
+
+# bytes hashed at the start and the end of the file for the cache key
+hash_block_size = 1 << 20
+
+
+def file_key(file_name, tree_name, weight):
+    # the key changes whenever the size, modification time or content of the file changes
+    # the content is fingerprinted by its first and last block, hashing whole samples would take as long as the scan
+    stat = os.stat(file_name)
+    key = hashlib.sha1()
+    key.update(os.path.abspath(file_name))
+    key.update(str(stat.st_size))
+    key.update(str(int(stat.st_mtime)))
+    with open(file_name, "rb") as f:
+        key.update(f.read(hash_block_size))
+        f.seek(max(0, stat.st_size - hash_block_size))
+        key.update(f.read(hash_block_size))
+    key.update(tree_name)
+    key.update(str(weight))
+    return key.hexdigest()
+
+
+def load(path, key):
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        try:
+            cached = json.load(f)
+        except ValueError:
+            return None
+    if cached.get("key") != key:
+        return None
+    return cached["entries"], cached["sumw"], cached["sumw2"]
+
+
+def save(path, key, entries, sumw, sumw2):
+    with open(path, "w") as f:
+        json.dump({"key": key, "entries": entries, "sumw": sumw, "sumw2": sumw2}, f, indent=2)
+
+
+# (entries, sumw, sumw2) of the tree in file_name, from the cache if the file has not changed
+# the cache is kept next to the input file, or in cache_dir
+def prescan(file_name, tree_name="mini", weight="mcWeight", chunk_size=2000000, use_cache=True, cache_dir=None):
+    key = file_key(file_name, tree_name, weight)
+    path = EntryList.sidecar_path(file_name, key, ".sumw", cache_dir)
+    if use_cache:
+        cached = load(path, key)
+        if cached is not None:
+            return cached
+
+    rootfile = ROOT.TFile.Open(file_name, "READ")
+    tree = rootfile.Get(tree_name)
+    if not tree:
+        raise ValueError("No tree " + tree_name + " in " + file_name)
+    entries, sumw, sumw2 = columnar.sum_weights(tree, weight, int(tree.GetEntries()), chunk_size)
+    rootfile.Close()
+
+    if use_cache:
+        try:
+            save(path, key, entries, sumw, sumw2)
+        except (IOError, OSError) as e:
+            print "Warning: could not write the cached sum of weights", path, ":", e
+    return entries, sumw, sumw2
+
+
+if __name__ == "__main__":
+    # e.g.   python prescan.py -f ../fp/data/MC/mc_147770.Zee.root
+    parser = argparse.ArgumentParser(description='Sum of weights of MC samples, reading only the weight branch.')
+    parser.add_argument('-f', metavar='inputFile', type=str, nargs='+', help='Input ROOT files', required=True)
+    parser.add_argument('-w', metavar='weight', type=str, nargs=1, help='Weight branch (default mcWeight)')
+    parser.add_argument('-nocache', action="store_true", help='Do not read or write the cached result next to the input file')
+    parser.add_argument('-cachedir', metavar='cacheDirectory', type=str, nargs=1, help='Directory for the cached results (default next to the input files)')
+
+    args = parser.parse_args()
+    weight = args.w[0] if args.w != None else "mcWeight"
+
+    print "%-40s %12s %20s %20s" % ("file", "entries", "sumw", "sumw2")
+    for file_name in args.f:
+        if not (os.path.isfile(file_name) and os.access(file_name, os.R_OK)):
+            sys.exit("Error: Input file " + file_name + " does not exist or is not readable")
+        entries, sumw, sumw2 = prescan(file_name, weight=weight, use_cache=not args.nocache,
+                                       cache_dir=args.cachedir[0] if args.cachedir != None else None)
+        print "%-40s %12d %20.10g %20.10g" % (os.path.basename(file_name), entries, sumw, sumw2)
@@ -1,4 +1,16 @@
-import os
+import sys
+import argparse
+import multiprocessing
+
+from jobs import Job, run_jobs
+
+parser = argparse.ArgumentParser(description='Run the Z analysis on all samples.')
+parser.add_argument('-j', metavar='workers', type=int, nargs=1, help='Maximum number of samples processed at the same time (default number of cores)')
+args = parser.parse_args()
+
+max_workers = multiprocessing.cpu_count()
+if args.j != None:
+    max_workers = args.j[0]
 
 base_path = "../fp/data/"
 data_path = base_path + "Data/"
@@ -9,8 +21,13 @@ file_type = ".root"
 data_files = {"DataEgamma": "e", "DataMuons": "m"}
 mc_files = {"mc_147770.Zee": "e", "mc_147771.Zmumu": "m", "mc_147772.Ztautau": "t"}
 
-# for df, tp in data_files.items():
-#     os.system("python eventloop.py -f " + data_path + df + file_type + " -p " + df + " -t " + tp)
+jobs = []
+
+for df, tp in data_files.items():
+    jobs.append(Job(df, ["python", "eventloop.py", "-f", data_path + df + file_type, "-p", df, "-t", tp], df + ".log"))
 
 for mcf, tp in mc_files.items():
-    os.system("python eventloop.py -f " + mc_path + mcf + file_type + " -p " + mcf + " -t " + tp + " -mc")
+    jobs.append(Job(mcf, ["python", "eventloop.py", "-f", mc_path + mcf + file_type, "-p", mcf, "-t", tp, "-mc"], mcf + ".log"))
+
+if not run_jobs(jobs, max_workers):
+    sys.exit("Error: Not all samples were processed successfully")
@@ -1,4 +1,19 @@
-import os
+import sys
+import argparse
+import multiprocessing
+
+from jobs import Job, run_jobs
+
+# run_all.py measures the same efficiencies while it analyzes the electron samples,
+# this only reruns the efficiency measurement on its own
+
+parser = argparse.ArgumentParser(description='Run the efficiency measurement on all samples.')
+parser.add_argument('-j', metavar='workers', type=int, nargs=1, help='Maximum number of samples processed at the same time (default number of cores)')
+args = parser.parse_args()
+
+max_workers = multiprocessing.cpu_count()
+if args.j != None:
+    max_workers = args.j[0]
 
 base_path = "../fp/data/"
 data_path = base_path + "Data/"
@@ -9,8 +24,13 @@ file_type = ".root"
 data_files = ["DataEgamma"]
 mc_files = ["mc_147770.Zee"]
 
+jobs = []
+
 for df in data_files:
-    os.system("python eventloop.eff.py -f " + data_path + df + file_type)
+    jobs.append(Job(df, ["python", "eventloop.eff.py", "-f", data_path + df + file_type], "eff_" + df + ".log"))
 
 for mcf in mc_files:
-    os.system("python eventloop.eff.py -f " + mc_path + mcf + file_type + " -mc")
+    jobs.append(Job(mcf, ["python", "eventloop.eff.py", "-f", mc_path + mcf + file_type, "-mc"], "eff_" + mcf + ".log"))
+
+if not run_jobs(jobs, max_workers):
+    sys.exit("Error: Not all samples were processed successfully")
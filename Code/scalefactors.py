@@ -0,0 +1,19 @@
+import argparse
+
+from efficiency import EfficiencyMap, ScaleFactors
+
+# combines the efficiency maps written by eventloop.eff.py for data and MC into a scale factor table
+# e.g.   python scalefactors.py -d effmap_DataEgamma.npz -mc effmap_mc_147770.Zee.npz -o scalefactors.npz
+parser = argparse.ArgumentParser(description='Data/MC scale factors from tag and probe efficiency maps.')
+parser.add_argument('-d', metavar='dataMap', type=str, nargs=1, help='Efficiency map of data', required=True)
+parser.add_argument('-mc', metavar='mcMap', type=str, nargs=1, help='Efficiency map of MC', required=True)
+parser.add_argument('-o', metavar='outputFile', type=str, nargs=1, help='Output file (default scalefactors.npz)')
+
+args = parser.parse_args()
+
+scale_factors = ScaleFactors.from_maps(EfficiencyMap.load(args.d[0]), EfficiencyMap.load(args.mc[0]))
+print scale_factors.table()
+
+output = args.o[0] if args.o != None else "scalefactors.npz"
+print "Writing scale factors to", output
+scale_factors.save(output)
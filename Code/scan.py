@@ -0,0 +1,226 @@
+import sys
+import argparse
+import multiprocessing
+from array import array
+
+import numpy
+import ROOT
+
+from lineshape import models, start_values, load_masses, fit_range, make_fit
+
+
+# parameters of the bw and conv models that can be scanned
+scan_parameters = {"M": 1, "Gamma": 2}
+
+# delta chi2 (or delta -2 ln L) of the 68% and 95% regions of one and two parameters
+levels_1d = [1.0, 3.84]
+levels_2d = [2.30, 5.99]
+
+
+# profile-likelihood scans of the line shape fits: at every grid point the scanned parameters are fixed to the
+# grid values and the other free parameters are fitted again, starting from the fit at the neighbouring point
+# the grid is cut into lines that walk away from the best fit, every line is fitted in order in one worker
+class Scan(object):
+    def __init__(self, model, histogram, masses=None, weights=None, xmin=70.0e3, xmax=130.0e3, fixed=None):
+        self.model = model
+        self.fitter = make_fit(model, histogram, masses, weights, xmin, xmax)
+        self.fixed = tuple(fixed if fixed is not None else model.fixed)
+
+        self.nominal = self.fitter.fit(start_values(model.name, histogram.sumw[1:-1].sum()), self.fixed)
+
+    # fit with the parameters of point, a list of (parameter index, value), fixed to their values
+    def profile(self, point, start):
+        par = list(start)
+        for i, value in point:
+            par[i] = value
+        fixed = tuple(sorted(set(self.fixed) | set(i for i, value in point)))
+        return self.fitter.fit(par, fixed)
+
+    # fits the points of a line in order, each started from the last converged fit
+    def run_line(self, line):
+        start = self.nominal.values
+        rv = []
+        for point in line:
+            result = self.profile(point, start)
+            if result.status == 0:
+                start = result.values
+            rv.append((result.fval, result.status))
+        return rv
+
+    # axes is a list of one or two (parameter name, values), the first axis is scanned along the lines
+    def lines(self, axes):
+        name, values = axes[0]
+        i = scan_parameters[name]
+        # the lines start at the grid point closest to the best fit and walk outwards
+        k = int(numpy.argmin(numpy.abs(values - self.nominal.values[i])))
+        outer = [(None, [])] if len(axes) == 1 else [(j, [(scan_parameters[axes[1][0]], value)]) for j, value in enumerate(axes[1][1])]
+
+        rv = []
+        for j, point in outer:
+            for columns in (range(k, len(values)), range(k - 1, -1, -1)):
+                if len(columns) > 0:
+                    rv.append(([(j, column) for column in columns], [point + [(i, values[column])] for column in columns]))
+        return rv
+
+    # runs the scan over the grid of axes, in processes worker processes if it is larger than 1
+    def run(self, axes, processes=1):
+        axes = [(name, numpy.asarray(values, dtype=numpy.float64)) for name, values in axes]
+        lines = self.lines(axes)
+
+        if processes <= 1:
+            results = [self.run_line(points) for indices, points in lines]
+        else:
+            global _scan
+            _scan = self
+            pool = multiprocessing.Pool(processes)
+            try:
+                results = pool.map(_run_line, [points for indices, points in lines], chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+                _scan = None
+
+        fval = numpy.zeros([len(values) for name, values in axes[::-1]])
+        status = numpy.zeros(fval.shape, dtype=numpy.int32)
+        for (indices, points), result in zip(lines, results):
+            for (j, column), (f, s) in zip(indices, result):
+                index = column if j is None else (j, column)
+                fval[index] = f
+                status[index] = s
+        return ScanResult(self, axes, fval, status)
+
+
+# the scan run in parallel, set before the worker processes are forked
+_scan = None
+
+
+def _run_line(points):
+    return _scan.run_line(points)
+
+
+# fval and MIGRAD status of the grid points, for two axes indexed [second axis, first axis]
+class ScanResult(object):
+    def __init__(self, scan, axes, fval, status):
+        self.scan = scan
+        self.axes = axes
+        self.fval = fval
+        self.status = status
+        # the scan can find a lower minimum than the nominal fit
+        converged = fval[status == 0]
+        self.minimum = min([scan.nominal.fval] + ([converged.min()] if len(converged) else []))
+
+    def delta(self):
+        return self.fval - self.minimum
+
+    # lower and upper end of the region with delta below level of a one-dimensional scan, linearly interpolated
+    # None if the region reaches the end of the grid
+    def interval(self, level=1.0):
+        values = self.axes[0][1]
+        delta = self.delta()
+        k = int(numpy.argmin(numpy.where(self.status == 0, delta, numpy.inf)))
+
+        def crossing(columns):
+            for a, b in zip(columns[:-1], columns[1:]):
+                if delta[b] >= level and self.status[b] == 0:
+                    return values[a] + (level - delta[a]) * (values[b] - values[a]) / (delta[b] - delta[a])
+            return None
+        return crossing(range(k, -1, -1)), crossing(range(k, len(values)))
+
+    def table(self):
+        nominal = self.scan.nominal
+        lines = ["%s scan of %s: %d points, %d failed fits" % (self.scan.model.name, " x ".join(name for name, values in self.axes),
+                                                               self.fval.size, numpy.count_nonzero(self.status))]
+        for name, values in self.axes:
+            i = scan_parameters[name]
+            lines.append("%-6s best fit %12.4f +- %8.4f GeV" % (name, nominal.values[i] * 1e-3, nominal.errors[i] * 1e-3))
+        if len(self.axes) == 1:
+            for level in levels_1d:
+                low, high = self.interval(level)
+                lines.append("%-6s delta = %.2f: [%s, %s] GeV" % (self.axes[0][0], level,
+                             "%.4f" % (low * 1e-3) if low is not None else "-", "%.4f" % (high * 1e-3) if high is not None else "-"))
+        return "\n".join(lines)
+
+    def save(self, path):
+        numpy.savez(path, names=[name for name, values in self.axes], fval=self.fval, status=self.status, minimum=self.minimum,
+                    **dict((name, values) for name, values in self.axes))
+
+    # delta versus the scanned parameter in GeV for one axis, the delta histogram with contours at levels for two
+    def draw(self):
+        delta = self.delta()
+        if len(self.axes) == 1:
+            x = numpy.ascontiguousarray(self.axes[0][1] * 1e-3)
+            y = numpy.ascontiguousarray(delta)
+            rv = ROOT.TGraph(len(x), x, y)
+            rv.SetTitle(";" + self.axes[0][0] + " / GeV;#Delta#chi^{2}")
+            rv.Draw("AL")
+            return rv
+
+        (xname, x), (yname, y) = self.axes
+        xedges = _edges(x * 1e-3)
+        yedges = _edges(y * 1e-3)
+        rv = ROOT.TH2D("scan", ";" + xname + " / GeV;" + yname + " / GeV;#Delta#chi^{2}", len(x), xedges, len(y), yedges)
+        rv.SetStats(False)
+        for j in range(len(y)):
+            for i in range(len(x)):
+                rv.SetBinContent(i + 1, j + 1, delta[j, i])
+        rv.Draw("COLZ")
+        contours = rv.Clone("contours")
+        contours.SetContour(len(levels_2d), array('d', levels_2d))
+        contours.Draw("CONT3 SAME")
+        return rv, contours
+
+
+# bin edges centered on the grid values
+def _edges(values):
+    middle = 0.5 * (values[1:] + values[:-1])
+    first = values[0] - (middle[0] - values[0]) if len(values) > 1 else values[0] - 0.5
+    last = values[-1] + (values[-1] - middle[-1]) if len(values) > 1 else values[-1] + 0.5
+    return array('d', [first] + list(middle) + [last])
+
+
+if __name__ == "__main__":
+    # e.g.   python scan.py -f analysis_DataEgamma.root -p M Gamma -n 50 -j 8
+    parser = argparse.ArgumentParser(description='Profile-likelihood scans of the Z mass and width.')
+    parser.add_argument('-f', metavar='inputFile', type=str, nargs=1, help='Analysis output, skim or masses_*.npz file', required=True)
+    parser.add_argument('-m', metavar='model', type=str, nargs=1, help='bw or conv (default conv)')
+    parser.add_argument('-p', metavar='parameter', type=str, nargs='+', help='One or two of M and Gamma (default M Gamma)')
+    parser.add_argument('-n', metavar='points', type=int, nargs=1, help='Number of grid points per parameter (default 50)')
+    parser.add_argument('-w', metavar='width', type=float, nargs=1, help='Half width of the grid in units of the fit errors (default 3)')
+    parser.add_argument('-j', metavar='processes', type=int, nargs=1, help='Number of worker processes (default number of cores)')
+    parser.add_argument('-o', metavar='outputFile', type=str, nargs=1, help='Output name without extension (default scan_<model>_<parameters>)')
+
+    args = parser.parse_args()
+    name = args.m[0] if args.m != None else "conv"
+    parameters = args.p if args.p != None else ["M", "Gamma"]
+    points = args.n[0] if args.n != None else 50
+    width = args.w[0] if args.w != None else 3.0
+    processes = args.j[0] if args.j != None else multiprocessing.cpu_count()
+    output = args.o[0] if args.o != None else "scan_" + name + "_" + "_".join(parameters)
+
+    if name not in ("bw", "conv"):
+        sys.exit("Error: Only the bw and conv models can be scanned")
+    if len(parameters) not in (1, 2) or len(set(parameters)) != len(parameters) or any(p not in scan_parameters for p in parameters):
+        sys.exit("Error: Scan one or two of M and Gamma")
+
+    histogram, masses, weights = load_masses(args.f[0])
+    xmin, xmax = fit_range(args.f[0])
+    scan = Scan(models[name], histogram, masses, weights, xmin, xmax)
+    if scan.nominal.status != 0:
+        print "Warning: the nominal fit did not converge"
+
+    axes = []
+    for parameter in parameters:
+        i = scan_parameters[parameter]
+        value, error = scan.nominal.values[i], scan.nominal.errors[i]
+        axes.append((parameter, numpy.linspace(value - width * error, value + width * error, points)))
+
+    result = scan.run(axes, processes)
+    print result.table()
+    result.save(output + ".npz")
+
+    ROOT.gStyle.SetOptStat(0)
+    canvas = ROOT.TCanvas("myCanvas", 'Likelihood Scan', 200, 10, 1050, 750)
+    canvas.cd()
+    drawn = result.draw()
+    canvas.Update()
+    canvas.SaveAs(output + ".png")
@@ -0,0 +1,265 @@
+import json
+import hashlib
+import re
+
+import numpy
+
+
+def isclose(a, b, rel_tol=1e-09, abs_tol=0.0):
+    return abs(a-b) <= max(rel_tol * max(abs(a), abs(b)), abs_tol)
+
+
+def isclose_columns(a, b, rel_tol=1e-09, abs_tol=0.0):
+    return numpy.abs(a-b) <= numpy.maximum(rel_tol * numpy.maximum(numpy.abs(a), numpy.abs(b)), abs_tol)
+
+
+# stable description of the byte code, constants, names and closure values of a function
+# it changes when the code of a cut changes, even if its definition string stays the same
+def code_fingerprint(function):
+    if function is None:
+        return ""
+
+    def describe(code):
+        parts = [code.co_code, repr(code.co_names)]
+        for const in code.co_consts:
+            # nested functions (e.g. lambdas inside the cut) are code objects with an address in their repr
+            parts.append(describe(const) if hasattr(const, "co_code") else repr(const))
+        return "|".join(parts)
+
+    parts = [describe(function.__code__)]
+    for cell in function.__closure__ or ():
+        value = cell.cell_contents
+        parts.append(code_fingerprint(value) if hasattr(value, "__code__") else repr(value))
+    return hashlib.sha1("|".join(parts)).hexdigest()
+
+
+# a single named step of a selection
+# definition is a human readable formula of the cut
+# passes works on one entry of the chain, passes_columns on whole arrays of the given expressions
+# the definition and the code of passes and passes_columns are part of the selection cache key
+class Cut(object):
+    def __init__(self, name, definition, passes, expressions=(), passes_columns=None):
+        self.name = name
+        self.definition = definition
+        self.passes = passes
+        self.expressions = list(expressions)
+        self.passes_columns = passes_columns
+
+    def __repr__(self):
+        return self.name + ": " + self.definition
+
+    # identifies the cut in cache keys, with the code of both implementations
+    def fingerprint(self):
+        return repr(self) + " [" + code_fingerprint(self.passes) + " " + code_fingerprint(self.passes_columns) + "]"
+
+
+# raw and weighted number of entries left after each cut of a selection
+class CutFlow(object):
+    def __init__(self, names, weight=None):
+        self.names = list(names)
+        self.weight = weight
+        # number of entries that passed exactly the first i cuts
+        self.passed = [0] * (len(self.names) + 1)
+        self.passed_weighted = [0.0] * (len(self.names) + 1)
+
+    def record(self, passed, weight=1):
+        self.passed[passed] += 1
+        self.passed_weighted[passed] += weight
+
+    # masks[i] are the entries left after cut i
+    def record_masks(self, masks, weights=None):
+        size = len(masks[0]) if masks else 0
+        if weights is None:
+            weights = numpy.ones(size)
+
+        left = [size] + [int(mask.sum()) for mask in masks]
+        # entries without a weight do not count in the weighted cut flow
+        left_weighted = [numpy.nansum(weights)] + [numpy.nansum(weights[mask]) for mask in masks]
+        for i in range(len(masks)):
+            self.passed[i] += left[i] - left[i + 1]
+            self.passed_weighted[i] += left_weighted[i] - left_weighted[i + 1]
+        self.passed[-1] += left[-1]
+        self.passed_weighted[-1] += left_weighted[-1]
+
+    def merge(self, other):
+        for i in range(len(self.passed)):
+            self.passed[i] += other.passed[i]
+            self.passed_weighted[i] += other.passed_weighted[i]
+
+    # (name, raw, weighted) for all entries and after each cut
+    def rows(self):
+        rv = []
+        for i, name in enumerate(["all"] + self.names):
+            rv.append((name, sum(self.passed[i:]), sum(self.passed_weighted[i:])))
+        return rv
+
+    def table(self):
+        lines = ["%-10s %12s %10s %16s %10s" % ("cut", "entries", "eff.", "weighted", "eff.")]
+        previous = None
+        for name, raw, weighted in self.rows():
+            if previous is None:
+                previous = (raw, weighted)
+            eff = float(raw) / previous[0] if previous[0] else 0.0
+            eff_weighted = weighted / previous[1] if previous[1] else 0.0
+            lines.append("%-10s %12d %10.4f %16.6g %10.4f" % (name, raw, eff, weighted, eff_weighted))
+            previous = (raw, weighted)
+        return "\n".join(lines)
+
+    def report(self):
+        return {
+            "weight": self.weight,
+            "cuts": [{"name": name, "entries": raw, "weighted": weighted} for name, raw, weighted in self.rows()],
+            "passed": self.passed,
+            "passed_weighted": self.passed_weighted,
+        }
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    @staticmethod
+    def load(path, names, weight=None):
+        try:
+            with open(path) as f:
+                report = json.load(f)
+        except (IOError, ValueError):
+            return None
+
+        if report["weight"] != weight or [cut["name"] for cut in report["cuts"]] != ["all"] + list(names):
+            return None
+
+        rv = CutFlow(names, weight)
+        rv.passed = report["passed"]
+        rv.passed_weighted = report["passed_weighted"]
+        return rv
+
+
+# an ordered list of cuts, callable like the selector functions used with Plot.acquire_entries
+# the cut flow is counted on the way, weighted with the given weight branch
+class Selection(object):
+    def __init__(self, name, cuts, weight=None):
+        self.name = name
+        self.cuts = cuts
+        self.weight = weight
+        self.cutflow = CutFlow([cut.name for cut in cuts], weight)
+
+    def __call__(self, data_item, chain):
+        for i, cut in enumerate(self.cuts):
+            if not cut.passes(chain):
+                self._record(i, chain)
+                return None
+        self._record(len(self.cuts), chain)
+        return data_item
+
+    def _record(self, passed, chain):
+        if self.weight is None:
+            self.cutflow.record(passed)
+        else:
+            self.cutflow.record(passed, chain.__getattr__(self.weight))
+
+    def reset_cutflow(self):
+        self.cutflow = CutFlow([cut.name for cut in self.cuts], self.weight)
+
+    def definition(self):
+        return "\n".join([self.name] + [cut.fingerprint() for cut in self.cuts])
+
+    def expressions(self):
+        rv = []
+        for cut in self.cuts:
+            for expression in cut.expressions:
+                if expression not in rv:
+                    rv.append(expression)
+        return rv
+
+    # names of the branches read by the cuts
+    def branches(self):
+        rv = []
+        for expression in self.expressions() + ([self.weight] if self.weight is not None else []):
+            branch = re.match(r"[A-Za-z_]\w*", expression).group(0)
+            if branch not in rv:
+                rv.append(branch)
+        return rv
+
+    # expressions needed by mask, including the weight
+    def columns(self):
+        return self.expressions() + ([self.weight] if self.weight is not None else [])
+
+    # vectorized selection over columns of expressions, see columnar.read_columns
+    def mask(self, columns):
+        size = len(columns[self.expressions()[0]])
+        rv = numpy.ones(size, dtype=bool)
+        masks = []
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            for cut in self.cuts:
+                rv &= cut.passes_columns(columns)
+                masks.append(rv.copy())
+        self.cutflow.record_masks(masks, columns[self.weight] if self.weight is not None else None)
+        return rv
+
+
+# lepton pdg ids for the analysis types
+lepton_types = {"e": 11, "m": 13, "t": 15}
+
+
+def z_selection(analyze_type, weight=None):
+    if analyze_type not in lepton_types:
+        raise ValueError("Invalid Type")
+
+    allowed_type = lepton_types[analyze_type]
+
+    def leading(branch):
+        return [branch + "[0]", branch + "[1]"]
+
+    def flag_set(column, bit):
+        return (numpy.nan_to_num(column).astype(numpy.int64) & (1 << bit)) != 0
+
+    cuts = []
+
+    if analyze_type == "e":
+        cuts.append(Cut("trigger", "trigE", lambda chain: chain.trigE,
+                        ["trigE"], lambda c: c["trigE"] != 0))
+    elif analyze_type == "m":
+        cuts.append(Cut("trigger", "trigM", lambda chain: chain.trigM,
+                        ["trigM"], lambda c: c["trigM"] != 0))
+
+    cuts += [
+        Cut("grl", "passGRL", lambda chain: chain.passGRL,
+            ["passGRL"], lambda c: c["passGRL"] != 0),
+        Cut("vertex", "hasGoodVertex", lambda chain: chain.hasGoodVertex,
+            ["hasGoodVertex"], lambda c: c["hasGoodVertex"] != 0),
+        # two leptons
+        Cut("lep_n", "lep_n >= 2", lambda chain: chain.lep_n >= 2,
+            ["lep_n"], lambda c: c["lep_n"] >= 2),
+        # two highest energy leptons must be electron (11), muon (13) or tau (15)
+        Cut("type", "lep_type[0] == %d && lep_type[1] == %d" % (allowed_type, allowed_type),
+            lambda chain: chain.lep_type[0] == allowed_type and chain.lep_type[1] == allowed_type,
+            leading("lep_type"),
+            lambda c: (c["lep_type[0]"] == allowed_type) & (c["lep_type[1]"] == allowed_type)),
+        # two highest energy leptons must have opposite charge
+        Cut("charge", "lep_charge[0] == -lep_charge[1]",
+            lambda chain: isclose(chain.lep_charge[0], -chain.lep_charge[1]),
+            leading("lep_charge"),
+            lambda c: isclose_columns(c["lep_charge[0]"], -c["lep_charge[1]"])),
+        # transverse momentum of the first two leptons must be at least 25GeV
+        Cut("pt", "lep_pt[0] >= 25e3 && lep_pt[1] >= 25e3",
+            lambda chain: not (chain.lep_pt[0] < 25e3 or chain.lep_pt[1] < 25e3),
+            leading("lep_pt"),
+            lambda c: ~((c["lep_pt[0]"] < 25e3) | (c["lep_pt[1]"] < 25e3))),
+        # Momentum Isolation
+        Cut("ptcone", "lep_ptcone30[0] / lep_pt[0] <= 0.15 && lep_ptcone30[1] / lep_pt[1] <= 0.15",
+            lambda chain: not (chain.lep_ptcone30[0] / chain.lep_pt[0] > 0.15 or chain.lep_ptcone30[1] / chain.lep_pt[1] > 0.15),
+            leading("lep_ptcone30") + leading("lep_pt"),
+            lambda c: ~((c["lep_ptcone30[0]"] / c["lep_pt[0]"] > 0.15) | (c["lep_ptcone30[1]"] / c["lep_pt[1]"] > 0.15))),
+        # Energy Isolation
+        Cut("etcone", "lep_etcone20[0] / lep_E[0] <= 0.15 && lep_etcone20[1] / lep_E[1] <= 0.15",
+            lambda chain: not (chain.lep_etcone20[0] / chain.lep_E[0] > 0.15 or chain.lep_etcone20[1] / chain.lep_E[1] > 0.15),
+            leading("lep_etcone20") + leading("lep_E"),
+            lambda c: ~((c["lep_etcone20[0]"] / c["lep_E[0]"] > 0.15) | (c["lep_etcone20[1]"] / c["lep_E[1]"] > 0.15))),
+        # check the 9th bit flag (tight detector selection)
+        Cut("tight", "lep_flag[0] & (1 << 9) && lep_flag[1] & (1 << 9)",
+            lambda chain: bool(chain.lep_flag[0] & (1 << 9)) and bool(chain.lep_flag[1] & (1 << 9)),
+            leading("lep_flag"),
+            lambda c: flag_set(c["lep_flag[0]"], 9) & flag_set(c["lep_flag[1]"], 9)),
+    ]
+
+    return Selection("Z -> " + analyze_type + analyze_type, cuts, weight)
@@ -0,0 +1,91 @@
+import ROOT
+import numpy
+
+import columnar
+import fourvector
+from plotwrapper import Histogram
+
+
+# writes the entries of the entry list to a new file, keeping only the given branches (None keeps all)
+# the skim has the same tree name and layout as the input, so it can be analyzed like the full file
+# sum_of_weights (entries, sumw, sumw2) of the full input is stored with the skim for the normalization
+def write_skim(chain, entry_list, branches, file_name, sum_of_weights=None):
+    if branches is not None:
+        chain.SetBranchStatus("*", 0)
+        for name in branches:
+            chain.SetBranchStatus(name, 1)
+
+    outfile = ROOT.TFile.Open(file_name, "RECREATE")
+    skim = chain.CloneTree(0)
+    for entry in entry_list.entries():
+        chain.GetEntry(entry)
+        skim.Fill()
+
+    print "Writing", skim.GetEntries(), "skimmed events to", file_name
+    skim.Write()
+    if sum_of_weights is not None:
+        write_sum_of_weights(outfile, *sum_of_weights)
+    outfile.Close()
+
+    chain.SetBranchStatus("*", 1)
+
+
+# number of entries, sum of weights and sum of squared weights of all entries read by eventloop.py
+# stored as TParameter<double>, which hadd adds up when outputs of parts of a sample are merged
+sum_of_weights_names = ("sumw_entries", "sumw", "sumw2")
+
+
+def write_sum_of_weights(directory, entries, sumw, sumw2):
+    for name, value in zip(sum_of_weights_names, (entries, sumw, sumw2)):
+        directory.WriteTObject(ROOT.TParameter("double")(name, value), name, "Overwrite")
+
+
+# (entries, sumw, sumw2) of an analysis output or skim, None for files written without them
+def read_sum_of_weights(rootfile):
+    parameters = [rootfile.Get(name) for name in sum_of_weights_names]
+    if not all(parameters):
+        return None
+    return tuple(parameter.GetVal() for parameter in parameters)
+
+
+# the invariant mass histograms of eventloop.py, computed from the events of a skim
+mass_histograms = {
+    "M": ("Invariant Mass M of two leading Leptons", "M_ll / MeV", "counts", 300, 70e3, 130e3),
+    "M_vec": ("Invariant Mass M_vec of two leading Leptons", "M_ll / MeV", "counts", 300, 70e3, 130e3),
+}
+
+
+def masses(tree):
+    expressions = [branch + "[" + str(i) + "]" for i in (0, 1) for branch in ("lep_pt", "lep_eta", "lep_phi", "lep_E")]
+    c = columnar.read_columns(tree, expressions, 0, int(tree.GetEntries()))
+
+    pt1, eta1, phi1, E1 = c["lep_pt[0]"], c["lep_eta[0]"], c["lep_phi[0]"], c["lep_E[0]"]
+    pt2, eta2, phi2, E2 = c["lep_pt[1]"], c["lep_eta[1]"], c["lep_phi[1]"], c["lep_E[1]"]
+
+    M = numpy.sqrt(2 * pt1 * pt2 * (numpy.cosh(eta1 - eta2) - numpy.cos(phi1 - phi2)))
+    # mass selection
+    M = M[(M >= 70e3) & (M <= 110e3)]
+
+    M_vec = fourvector.invariant_mass(pt1, eta1, phi1, E1, pt2, eta2, phi2, E2).data
+
+    return {"M": M, "M_vec": M_vec}
+
+
+# reads a histogram from an analysis output file, or rebuilds it if the file is a skim
+def get_histogram(rootfile, name):
+    hist = rootfile.Get(name)
+    if hist or name not in mass_histograms:
+        return hist
+
+    tree = rootfile.Get("mini")
+    if not tree:
+        return hist
+
+    title, xlabel, ylabel, bins, xmin, xmax = mass_histograms[name]
+    histogram = Histogram(name, title + ";" + xlabel + ";" + ylabel, bins, xmin, xmax)
+    histogram.fill(masses(tree)[name])
+
+    hist = histogram.to_th1d()
+    # keep the histogram when the read-only input file is closed
+    hist.SetDirectory(0)
+    return hist
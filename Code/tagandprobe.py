@@ -0,0 +1,112 @@
+import math
+
+import ROOT
+
+from efficiency import Efficiency, EfficiencyMap
+from plotwrapper import Plot
+
+
+def isclose(a, b, rel_tol=1e-09, abs_tol=0.0):
+    return abs(a-b) <= max(rel_tol * max(abs(a), abs(b)), abs_tol)
+
+
+# tight id efficiency measured with tag and probe on Z -> ee events
+# the first electron is the tag, the tight id flag of the second electron is probed
+# the efficiencies are binned in the kinematics of the probe, so they can be looked up per electron
+# used as a consumer of the EventLoop, so it sees every entry that is read, independent of the main selection
+class TagAndProbe(object):
+    def __init__(self, phi=False):
+        self.phi = phi
+        # the same efficiency binned in pt x eta (x phi), data and MC maps give the scale factors (see scalefactors.py)
+        self.map_axes = [
+            ("pt", [25e3, 30e3, 35e3, 40e3, 45e3, 50e3, 60e3, 80e3, 120e3, 300e3]),
+            ("eta", [-2.47, -1.52, -1.37, -0.8, 0, 0.8, 1.37, 1.52, 2.47]),
+        ]
+        if phi:
+            self.map_axes.append(("phi", EfficiencyMap.uniform(8, -math.pi, math.pi)))
+        self.reset()
+
+    def reset(self):
+        self.efficiency = Efficiency("eff", "eff;x;y", 100, 0, 300e3)
+        self.efficiency_map = EfficiencyMap("eff_map", self.map_axes)
+
+    def branches(self):
+        return ["trigE", "passGRL", "hasGoodVertex", "lep_n", "lep_type", "lep_charge", "lep_pt", "lep_eta", "lep_phi",
+                "lep_ptcone30", "lep_etcone20", "lep_E", "lep_flag"]
+
+    # the tag has to be a triggered, isolated, tight electron with at least 25 GeV
+    def is_tag(self, chain):
+        if not chain.trigE or not chain.passGRL or not chain.hasGoodVertex:
+            return False
+
+        if chain.lep_n < 2:
+            return False
+
+        if chain.lep_type[0] != 11:
+            return False
+
+        charge = chain.lep_charge[0]
+        if not isclose(charge, -1) and not isclose(charge, +1):
+            return False
+
+        pt = chain.lep_pt[0]
+        if pt < 25e3:
+            return False
+
+        if chain.lep_ptcone30[0] / pt > 0.15:
+            return False
+
+        if chain.lep_etcone20[0] / chain.lep_E[0] > 0.15:
+            return False
+
+        return bool(chain.lep_flag[0] & (1 << 9))
+
+    # the probe has to be an electron with at least 25 GeV
+    def is_probe(self, chain):
+        return chain.lep_type[1] == 11 and chain.lep_pt[1] >= 25e3
+
+    def process(self, chain, weight):
+        if not self.is_tag(chain) or not self.is_probe(chain):
+            return
+
+        passed = chain.lep_flag[1] & (1 << 9)
+        pt = chain.lep_pt[1]
+        self.efficiency.fill(pt, passed, weight)
+        self.efficiency_map.fill((pt, chain.lep_eta[1], chain.lep_phi[1])[:len(self.map_axes)], passed, weight)
+
+    def finish(self):
+        self.efficiency.flush()
+        self.efficiency_map.flush()
+
+    # used to merge the results of parallel event loops
+    def state(self):
+        self.finish()
+        return self.efficiency, self.efficiency_map
+
+    def merge(self, state):
+        efficiency, efficiency_map = state
+        self.efficiency.merge(efficiency)
+        self.efficiency_map.merge(efficiency_map)
+
+    # draws numerator, denominator and efficiency and saves the efficiency map to effmap_<inputFile>.npz
+    def save(self, input_name, mc, save_path=""):
+        self.finish()
+        name_suffix = "_mc" if mc else ""
+        self.efficiency_map.save("effmap_" + input_name.split('/')[-1].replace(".root", ".npz"))
+
+        plot_num = Plot(None, "eff_num", False, "eff_num", "x", "y", 100, 0, 300e3)
+        plot_den = Plot(None, "eff_den", False, "eff_den", "x", "y", 100, 0, 300e3)
+        plot_eff = Plot(None, "eff", False, "eff", "x", "y", 100, 0, 300e3)
+        plot_num.set_histogram(self.efficiency.passed)
+        plot_den.set_histogram(self.efficiency.total)
+        plot_eff.set_histogram(self.efficiency.histogram("eff"))
+
+        plot_num.draw_and_save(save_path + "num" + name_suffix + ".png", which=(0,), log_scale=(0, 0))
+        plot_den.draw_and_save(save_path + "den" + name_suffix + ".png", which=(0,), log_scale=(0, 0))
+        plot_eff.draw_and_save(save_path + "eff" + name_suffix + ".png", which=(0,), log_scale=(0, 0))
+
+        canvas = ROOT.TCanvas("eff_cp" + name_suffix, 'Analysis Plots', 200, 10, 700, 500)
+        canvas.cd()
+        graph = self.efficiency.graph("clopper_pearson")
+        graph.Draw("AP")
+        canvas.SaveAs(save_path + "eff_cp" + name_suffix + ".png")
@@ -0,0 +1,147 @@
+import numpy
+
+from lineshape import minimize
+
+
+# binned Poisson likelihood fit of data with a sum of templates, every template scaled by its own normalization mu
+# shape nuisances theta move the templates to their up (theta = 1) and down (theta = -1) variations, interpolated
+# linearly in between and beyond, with a unit Gaussian constraint
+# the expectation of all bins and templates is computed in one vectorized call per iteration
+class TemplateFit(object):
+    def __init__(self, data, templates, names, edges=None, xmin=None, xmax=None):
+        self.names = list(names)
+        data = numpy.asarray(data, dtype=numpy.float64)
+        templates = numpy.asarray(templates, dtype=numpy.float64).reshape(len(self.names), -1)
+
+        # bins with lower edge >= xmin and upper edge <= xmax
+        self.mask = numpy.ones(len(data), dtype=bool)
+        if edges is not None:
+            edges = numpy.asarray(edges, dtype=numpy.float64)
+            if xmin is not None:
+                self.mask &= edges[:-1] >= xmin
+            if xmax is not None:
+                self.mask &= edges[1:] <= xmax
+
+        self.data = data[self.mask]
+        self.templates = templates[:, self.mask]
+        self.nuisances = []
+        self.up = numpy.zeros((0,) + self.templates.shape)
+        self.down = numpy.zeros((0,) + self.templates.shape)
+
+    @staticmethod
+    def from_histograms(data, templates, names, xmin=None, xmax=None):
+        edges = numpy.linspace(data.xmin, data.xmax, data.bins + 1)
+        return TemplateFit(data.sumw[1:-1], [template.sumw[1:-1] for template in templates], names, edges, xmin, xmax)
+
+    # up and down are {template name: bin contents of the variation}, templates not given are not affected
+    def add_shape(self, name, up, down):
+        self.nuisances.append(name)
+        shifts = []
+        for variation in (up, down):
+            shift = numpy.zeros((1,) + self.templates.shape)
+            for i, template in enumerate(self.names):
+                if template in variation:
+                    shift[0, i] = numpy.asarray(variation[template], dtype=numpy.float64)[self.mask] - self.templates[i]
+            shifts.append(shift)
+        self.up = numpy.concatenate([self.up, shifts[0]])
+        self.down = numpy.concatenate([self.down, shifts[1]])
+
+    @property
+    def parameters(self):
+        return ["mu_" + name for name in self.names] + ["theta_" + name for name in self.nuisances]
+
+    # expected bin contents of the sum of the templates
+    def expected(self, par):
+        par = numpy.asarray(par, dtype=numpy.float64)
+        mu = par[:len(self.names)]
+        theta = par[len(self.names):, numpy.newaxis, numpy.newaxis]
+        templates = self.templates + numpy.where(theta >= 0, theta * self.up, -theta * self.down).sum(axis=0)
+        return mu.dot(numpy.maximum(templates, 0))
+
+    # -2 ln of the Poisson likelihood ratio to the saturated model, plus the nuisance constraints
+    def __call__(self, par):
+        nu = numpy.maximum(self.expected(par), 1e-300)
+        n = self.data
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            log_term = numpy.where(n > 0, n * numpy.log(n / nu), 0.0)
+        theta = numpy.asarray(par[len(self.names):], dtype=numpy.float64)
+        return 2.0 * numpy.sum(nu - n + log_term) + numpy.sum(theta ** 2)
+
+    # covariance from the numerical second derivatives of -2 ln L at par
+    def covariance(self, par, fixed=()):
+        free = [i for i in range(len(par)) if i not in fixed]
+        par = numpy.asarray(par, dtype=numpy.float64)
+        steps = numpy.where(par[free] != 0, 1e-4 * numpy.abs(par[free]), 1e-4)
+        hessian = numpy.zeros((len(free), len(free)))
+        for a, i in enumerate(free):
+            for b, j in enumerate(free):
+                f = []
+                for si, sj in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+                    shifted = par.copy()
+                    shifted[i] += si * steps[a]
+                    shifted[j] += sj * steps[b]
+                    f.append(self(shifted))
+                hessian[a, b] = (f[0] - f[1] - f[2] + f[3]) / (4 * steps[a] * steps[b])
+
+        rv = numpy.zeros((len(par), len(par)))
+        rv[numpy.ix_(free, free)] = 2.0 * numpy.linalg.inv(hessian)
+        return rv
+
+    # start defaults to mu = 1 and theta = 0, parameters in fixed are kept at their start values
+    def fit(self, start=None, fixed=()):
+        if start is None:
+            start = [1.0] * len(self.names) + [0.0] * len(self.nuisances)
+        steps = [0.01 if i < len(self.names) else 0.1 for i in range(len(start))]
+        values, errors, fval, status = minimize(self, self.parameters, start, steps, fixed)
+        ndf = len(self.data) - (len(start) - len(set(fixed)))
+        return TemplateFitResult(self, values, errors, fval, ndf, status, self.covariance(values, fixed))
+
+
+class TemplateFitResult(object):
+    def __init__(self, fitter, values, errors, fval, ndf, status, covariance):
+        self.fitter = fitter
+        self.values = values
+        self.errors = errors
+        self.fval = fval
+        self.ndf = ndf
+        self.status = status
+        self.covariance = covariance
+
+    def mu(self, name):
+        return self.values[self.fitter.names.index(name)]
+
+    # fitted yield of a template in the fit range and its error
+    def fitted_yield(self, name):
+        i = self.fitter.names.index(name)
+        total = self.fitter.templates[i].sum()
+        return self.values[i] * total, self.errors[i] * total
+
+    # mu_a * scale_a / (mu_b * scale_b), e.g. the ratio of the cross sections for scales xsec_a / xsec_b,
+    # with the error from the covariance of mu_a and mu_b
+    def ratio(self, a, b, scale_a=1.0, scale_b=1.0):
+        i = self.fitter.names.index(a)
+        j = self.fitter.names.index(b)
+        mu_a, mu_b = self.values[i], self.values[j]
+        ratio = mu_a * scale_a / (mu_b * scale_b)
+        relative2 = (self.covariance[i, i] / mu_a ** 2 + self.covariance[j, j] / mu_b ** 2
+                     - 2 * self.covariance[i, j] / (mu_a * mu_b))
+        return ratio, abs(ratio) * numpy.sqrt(max(relative2, 0.0))
+
+    def table(self):
+        lines = ["template fit: -2 ln L / NDF = %.1f / %d, status %d" % (self.fval, self.ndf, self.status)]
+        lines.append("%-12s %10s %9s %14s %12s" % ("parameter", "value", "error", "yield", "error"))
+        for i, name in enumerate(self.fitter.parameters):
+            if i < len(self.fitter.names):
+                lines.append("%-12s %10.4f %9.4f %14.1f %12.1f" % ((name, self.values[i], self.errors[i]) + self.fitted_yield(self.fitter.names[i])))
+            else:
+                lines.append("%-12s %10.4f %9.4f" % (name, self.values[i], self.errors[i]))
+        return "\n".join(lines)
+
+
+# bin contents of a histogram with the x axis scaled by factor, e.g. for a lepton energy scale variation
+# the content is moved with the cumulative distribution, interpolated linearly within the bins
+def scaled_template(histogram, factor):
+    edges = numpy.linspace(histogram.xmin, histogram.xmax, histogram.bins + 1)
+    cumulative = numpy.concatenate([[0.0], numpy.cumsum(histogram.sumw[1:-1])])
+    moved = numpy.interp(edges / factor, edges, cumulative)
+    return numpy.diff(moved)
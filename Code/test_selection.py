@@ -0,0 +1,32 @@
+import unittest
+import tempfile
+
+from selection import Cut, Selection, z_selection
+from entrylist import EntryList
+
+
+def selection(threshold, definition="lep_pt[0] >= 25e3"):
+    return Selection("pt", [Cut("pt", definition, lambda chain: chain.lep_pt[0] >= threshold,
+                                ["lep_pt[0]"], lambda c: c["lep_pt[0]"] >= threshold)])
+
+
+class CacheKeyTest(unittest.TestCase):
+    # a cut whose code changes but whose definition string stays the same must not reuse a cached entry list
+    def test_key_changes_with_cut_code(self):
+        with tempfile.NamedTemporaryFile(suffix=".root") as f:
+            first = Selection("pt", [Cut("pt", "lep_pt[0] >= 25e3", lambda chain: chain.lep_pt[0] >= 25e3)])
+            second = Selection("pt", [Cut("pt", "lep_pt[0] >= 25e3", lambda chain: chain.lep_pt[0] > 25e3)])
+            self.assertNotEqual(EntryList.key(f.name, first.definition()), EntryList.key(f.name, second.definition()))
+
+            # values captured by the cuts are part of the key too
+            self.assertNotEqual(EntryList.key(f.name, selection(25e3).definition()), EntryList.key(f.name, selection(30e3).definition()))
+
+    def test_key_is_stable(self):
+        with tempfile.NamedTemporaryFile(suffix=".root") as f:
+            self.assertEqual(EntryList.key(f.name, selection(25e3).definition()), EntryList.key(f.name, selection(25e3).definition()))
+            self.assertEqual(z_selection("e").definition(), z_selection("e").definition())
+            self.assertNotEqual(z_selection("e").definition(), z_selection("m").definition())
+
+
+if __name__ == "__main__":
+    unittest.main()
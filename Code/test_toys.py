@@ -0,0 +1,28 @@
+import unittest
+
+import numpy
+
+from plotwrapper import Histogram
+from lineshape import models
+from toys import ToyStudy
+
+
+class BootstrapTest(unittest.TestCase):
+    # the bootstrap of an unbinned fit has to reproduce the fit errors, i.e. pulls of unit width
+    def test_unbinned_pull_width(self):
+        random = numpy.random.RandomState(7)
+        masses = random.normal(91.0e3, 3.0e3, 2000)
+        histogram = Histogram("M", "M", 120, 70.0e3, 130.0e3)
+        histogram.fill(masses)
+
+        study = ToyStudy(models["gauss"], histogram, masses, None, 70.0e3, 130.0e3, method="bootstrap", seed=1)
+        results = study.run_all(200)
+
+        self.assertEqual(results.failed, 0)
+        for name, value, error, bias, spread, pull_mean, pull_width, coverage in results.rows():
+            self.assertAlmostEqual(pull_width, 1.0, delta=0.2, msg=name)
+            self.assertAlmostEqual(spread / error, 1.0, delta=0.2, msg=name)
+
+
+if __name__ == "__main__":
+    unittest.main()
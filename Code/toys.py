@@ -0,0 +1,144 @@
+import sys
+import argparse
+import multiprocessing
+
+import numpy
+
+from lineshape import models, start_values, load_masses, fit_range, fit
+
+
+# pseudo-experiments for the uncertainties of the line shape fits
+# "toys" draws Poisson fluctuated histograms from the nominal fit (binned fits only),
+# "bootstrap" resamples the data: Poisson fluctuated bin contents for histograms, events drawn with replacement for masses
+# every pseudo-experiment i uses its own numpy.random.RandomState(seed + i), so results do not depend on the workers
+class ToyStudy(object):
+    def __init__(self, model, histogram, masses=None, weights=None, xmin=70.0e3, xmax=130.0e3, fixed=None, method="toys", seed=1):
+        if method not in ("toys", "bootstrap"):
+            raise ValueError("Unknown method " + method)
+        if method == "toys" and masses is not None:
+            raise ValueError("Toys are generated from the binned fit, use the bootstrap for masses")
+
+        self.model = model
+        self.histogram = histogram
+        self.masses = numpy.asarray(masses) if masses is not None else None
+        self.weights = numpy.asarray(weights) if weights is not None else None
+        self.xmin = xmin
+        self.xmax = xmax
+        self.fixed = fixed
+        self.method = method
+        self.seed = seed
+
+        self.nominal = fit(model, start_values(model.name, histogram.sumw[1:-1].sum()), histogram, masses, weights, xmin, xmax, fixed)
+
+    def generate(self, i):
+        random = numpy.random.RandomState(self.seed + i)
+        if self.masses is not None:
+            # resampling by index keeps the event weights, multiplicities as weights would enter the sumw / sumw2 scale
+            # of UnbinnedFit and inflate the errors
+            index = random.randint(0, len(self.masses), len(self.masses))
+            return self.histogram, self.masses[index], self.weights[index] if self.weights is not None else None
+
+        histogram = self.histogram.copy()
+        if self.method == "toys":
+            expected = numpy.zeros(histogram.bins + 2)
+            expected[1:-1] = numpy.maximum(self.model(histogram.centers()[1:-1], self.nominal.values), 0)
+        else:
+            expected = numpy.maximum(histogram.sumw, 0)
+        histogram.sumw = random.poisson(expected).astype(numpy.float64)
+        histogram.sumw2 = histogram.sumw.copy()
+        return histogram, None, None
+
+    # values, errors and MIGRAD status of pseudo-experiment i, started from the nominal fit
+    def run(self, i):
+        histogram, masses, weights = self.generate(i)
+        result = fit(self.model, self.nominal.values, histogram, masses, weights, self.xmin, self.xmax, self.fixed)
+        return result.values, result.errors, result.status
+
+    # runs the pseudo-experiments first, ..., first + n - 1, in processes worker processes if it is larger than 1
+    def run_all(self, n, processes=1, first=0):
+        if processes <= 1:
+            return ToyResults(self, [self.run(i) for i in range(first, first + n)])
+
+        global _toy_study
+        _toy_study = self
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_run_toy, range(first, first + n), chunksize=max(1, n // (4 * processes)))
+        finally:
+            pool.close()
+            pool.join()
+            _toy_study = None
+        return ToyResults(self, results)
+
+
+# the study run in parallel, set before the worker processes are forked
+_toy_study = None
+
+
+def _run_toy(i):
+    return _toy_study.run(i)
+
+
+# bias, pull and coverage of the pseudo-experiments with respect to the nominal fit
+class ToyResults(object):
+    def __init__(self, study, results):
+        self.study = study
+        # failed fits are left out of the statistics
+        converged = [result for result in results if result[2] == 0]
+        self.failed = len(results) - len(converged)
+        self.values = numpy.array([result[0] for result in converged])
+        self.errors = numpy.array([result[1] for result in converged])
+
+    def __len__(self):
+        return len(self.values)
+
+    # (name, nominal value, nominal error, bias, spread, pull mean, pull width, coverage) of every free parameter
+    def rows(self):
+        nominal = self.study.nominal
+        fixed = self.study.fixed if self.study.fixed is not None else self.study.model.fixed
+        rv = []
+        for i, name in enumerate(self.study.model.parameters):
+            if i in fixed or (self.study.masses is not None and i == 0) or len(self) == 0:
+                continue
+            deviation = self.values[:, i] - nominal.values[i]
+            with numpy.errstate(divide="ignore", invalid="ignore"):
+                pulls = deviation / self.errors[:, i]
+            pulls = pulls[numpy.isfinite(pulls)]
+            coverage = numpy.mean(numpy.abs(deviation) <= self.errors[:, i])
+            rv.append((name, nominal.values[i], nominal.errors[i], deviation.mean(), self.values[:, i].std(),
+                       pulls.mean() if len(pulls) else 0.0, pulls.std() if len(pulls) else 0.0, coverage))
+        return rv
+
+    def table(self):
+        lines = ["%s %s: %d pseudo-experiments, %d failed fits" % (self.study.model.name, self.study.method, len(self), self.failed)]
+        lines.append("%-8s %14s %12s %12s %12s %10s %10s %9s" % ("par", "nominal", "error", "bias", "spread", "pull mean", "pull width", "coverage"))
+        for row in self.rows():
+            lines.append("%-8s %14.6g %12.4g %12.4g %12.4g %10.3f %10.3f %9.3f" % row)
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # e.g.   python toys.py -f analysis_DataEgamma.root -n 1000 -j 8
+    parser = argparse.ArgumentParser(description='Pseudo-experiments for the Z line shape fits.')
+    parser.add_argument('-f', metavar='inputFile', type=str, nargs=1, help='Analysis output, skim or masses_*.npz file', required=True)
+    parser.add_argument('-n', metavar='numToys', type=int, nargs=1, help='Number of pseudo-experiments per model (default 1000)')
+    parser.add_argument('-j', metavar='processes', type=int, nargs=1, help='Number of worker processes (default number of cores)')
+    parser.add_argument('-m', metavar='method', type=str, nargs=1, help='toys or bootstrap (default toys for histograms, bootstrap for masses)')
+    parser.add_argument('-models', metavar='model', type=str, nargs='+', help='Models to fit (default gauss bw conv)')
+    parser.add_argument('-seed', metavar='seed', type=int, nargs=1, help='Seed of the first pseudo-experiment (default 1)')
+
+    args = parser.parse_args()
+    num_toys = args.n[0] if args.n != None else 1000
+    processes = args.j[0] if args.j != None else multiprocessing.cpu_count()
+    seed = args.seed[0] if args.seed != None else 1
+
+    histogram, masses, weights = load_masses(args.f[0])
+    xmin, xmax = fit_range(args.f[0])
+    method = args.m[0] if args.m != None else ("toys" if masses is None else "bootstrap")
+
+    for name in (args.models if args.models != None else ["gauss", "bw", "conv"]):
+        if name not in models:
+            sys.exit("Error: Unknown model " + name)
+        study = ToyStudy(models[name], histogram, masses, weights, xmin, xmax, method=method, seed=seed)
+        print study.run_all(num_toys, processes).table()
+        print